@@ -0,0 +1,321 @@
+"""Scaling benchmark for the server checker against a local fake fleet.
+
+Starts N stand-in hosts as TCP listeners on loopback addresses
+(127.0.x.y) in a separate process, points a headless MonitorEngine at
+them and drives full check cycles through the real run_ping, history,
+text log and trim_log paths.
+
+    python benchmarks/bench_fleet.py --sizes 10 100 1000 10000 --output bench_results.json
+
+Each fleet size runs in a fresh interpreter so peak RSS is per size.
+Fault injection:
+
+    --down-pct       hosts whose listener is closed for the whole run (connection refused)
+    --loss-pct       per-cycle chance that a host's listener is closed for that cycle
+    --blackhole-pct  hosts pointed at an unroutable TEST-NET address, so probes time out
+    --netem-delay-ms adds latency on the loopback device with `tc netem` (Linux, root only)
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Fake Fleet ---
+def host_address(index):
+    return f"127.0.{index // 250}.{index % 250 + 1}"
+
+def fleet_process(size, conn):
+    """Owns the stand-in listeners. Commands arrive over `conn` as (name, args)."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < size + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, size + 256), hard))
+
+    selector = selectors.DefaultSelector()
+    listeners = {}
+    ports = {}
+    lock = threading.Lock()
+
+    def open_listener(index):
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host_address(index), ports.get(index, 0)))
+        sock.listen(64)
+        sock.setblocking(False)
+        ports[index] = sock.getsockname()[1]
+        listeners[index] = sock
+        selector.register(sock, selectors.EVENT_READ)
+
+    def close_listener(index):
+        sock = listeners.pop(index, None)
+        if sock is not None:
+            selector.unregister(sock)
+            sock.close()
+
+    def accept_loop():
+        while True:
+            with lock:
+                events = selector.select(timeout=0.05) if listeners else []
+                for key, _ in events:
+                    try:
+                        client, _ = key.fileobj.accept()
+                        client.close()
+                    except OSError:
+                        pass
+            if not listeners:
+                time.sleep(0.05)
+
+    with lock:
+        for index in range(size):
+            open_listener(index)
+    threading.Thread(target=accept_loop, daemon=True).start()
+    conn.send(dict(ports))
+
+    while True:
+        name, args = conn.recv()
+        if name == "set_down":
+            down = set(args)
+            with lock:
+                for index in range(size):
+                    if index in down:
+                        close_listener(index)
+                    elif index not in listeners:
+                        open_listener(index)
+            conn.send(True)
+        elif name == "stop":
+            return
+
+class FakeFleet:
+    def __init__(self, size):
+        self.size = size
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=fleet_process, args=(size, child), daemon=True)
+        self.process.start()
+        self.ports = self.conn.recv()
+
+    def set_down(self, indexes):
+        self.conn.send(("set_down", sorted(indexes)))
+        self.conn.recv()
+
+    def stop(self):
+        self.conn.send(("stop", None))
+        self.process.join(5)
+
+def netem(action, delay_ms):
+    command = ["tc", "qdisc", action, "dev", "lo", "root", "netem", "delay", f"{delay_ms}ms"]
+    if action == "del":
+        command = ["tc", "qdisc", "del", "dev", "lo", "root"]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"tc netem {action} failed: {result.stderr.strip()}", file=sys.stderr)
+        return False
+    return True
+
+
+# --- Measurement ---
+def read_proc_io():
+    """Returns this process's (write_bytes, write syscalls) on Linux, else (None, None)."""
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return int(values["wchar"]), int(values["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def run_size(args):
+    """Benchmarks one fleet size in this process and returns the result dict."""
+    rng = random.Random(args.seed)
+    size = args.size
+    indexes = list(range(size))
+    down = set(rng.sample(indexes, int(size * args.down_pct / 100)))
+    blackholed = set(rng.sample(indexes, int(size * args.blackhole_pct / 100)))
+
+    fleet = FakeFleet(size)
+    with tempfile.TemporaryDirectory(prefix="server-check-bench-") as workdir:
+        previous_dir = os.getcwd()
+        os.chdir(workdir)
+        try:
+            return run_cycles(args, rng, fleet, indexes, down, blackholed)
+        finally:
+            os.chdir(previous_dir)
+            fleet.stop()
+
+def run_cycles(args, rng, fleet, indexes, down, blackholed):
+    """Runs the check cycles from the current (scratch) directory."""
+    size = args.size
+
+    entries = []
+    for index in indexes:
+        if index in blackholed:
+            entries.append({"host": f"blackhole-{index}", "probe": "tcp", "port": 9})
+        else:
+            entries.append({"host": host_address(index), "probe": "tcp", "port": fleet.ports[index]})
+    with open("servers.json", "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    with open("settings.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "probe_timeout_seconds": args.timeout,
+            "max_in_flight": args.max_in_flight,
+            "confirm_delay_seconds": args.confirm_delay
+        }, f)
+
+    sys.path.insert(0, REPO_DIR)
+    import server_checker
+
+    finished = threading.Event()
+    engine = server_checker.MonitorEngine(on_results=lambda results: finished.set())
+    # Stand-in DNS: blackholed hosts resolve to TEST-NET-1, which is never routed,
+    # so their connects wait for the full probe timeout
+    for index in blackholed:
+        engine.resolver.entries[f"blackhole-{index}"] = ("192.0.2.1", float("inf"))
+    probe_count = [0]
+    probe = engine.probe_engine.probe
+
+    def counting_probe(host):
+        probe_count[0] += 1
+        return probe(host)
+
+    engine.probe_engine.probe = counting_probe
+    engine.coordinator.start()
+
+    cycles = []
+    for cycle in range(args.cycles):
+        lost = {i for i in indexes if i not in down and rng.random() * 100 < args.loss_pct}
+        fleet.set_down(down | lost)
+
+        probe_count[0] = 0
+        log_bytes_before = directory_size(server_checker.LOG_DIR)
+        wchar_before, syscw_before = read_proc_io()
+        cpu_before = cpu_seconds()
+        finished.clear()
+        start = time.perf_counter()
+        engine.run_ping(engine.servers)
+        finished.wait()
+        wall = time.perf_counter() - start
+        cpu = cpu_seconds() - cpu_before
+        wchar_after, syscw_after = read_proc_io()
+        log_bytes_written = directory_size(server_checker.LOG_DIR) - log_bytes_before
+
+        # trim_log runs after every cycle in the app, so time it per cycle
+        start = time.perf_counter()
+        server_checker.trim_log(history=engine.history)
+        trim = time.perf_counter() - start
+
+        cycles.append({
+            "wall_seconds": wall,
+            "probes": probe_count[0],
+            "probes_per_second": probe_count[0] / wall if wall else None,
+            "cpu_seconds": cpu,
+            "log_bytes_written": log_bytes_written,
+            "bytes_written": wchar_after - wchar_before if wchar_before is not None else None,
+            "write_syscalls": syscw_after - syscw_before if syscw_before is not None else None,
+            "trim_log_seconds": trim,
+            "online": sum(1 for status in engine.last_status.values() if status)
+        })
+
+    engine.stop()
+
+    walls = sorted(c["wall_seconds"] for c in cycles)
+    return {
+        "hosts": size,
+        "cycles": cycles,
+        "median_wall_seconds": walls[len(walls) // 2],
+        "max_wall_seconds": walls[-1],
+        "median_probes_per_second": sorted(c["probes_per_second"] for c in cycles)[len(cycles) // 2],
+        "cpu_seconds_total": sum(c["cpu_seconds"] for c in cycles),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "trim_log_seconds": sorted(c["trim_log_seconds"] for c in cycles)[len(cycles) // 2],
+        "log_dir_bytes": directory_size(server_checker.LOG_DIR)
+    }
+
+
+# --- Driver ---
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark check cycles against a local fake fleet")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=1, help="per-probe timeout in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--confirm-delay", type=float, default=1, help="delay between failure confirmation probes")
+    parser.add_argument("--down-pct", type=float, default=0)
+    parser.add_argument("--loss-pct", type=float, default=0)
+    parser.add_argument("--blackhole-pct", type=float, default=0)
+    parser.add_argument("--netem-delay-ms", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        # Worker mode: one size per interpreter, result as JSON on stdout
+        print(json.dumps(run_size(args)))
+        return
+
+    if args.netem_delay_ms and not netem("add", args.netem_delay_ms):
+        args.netem_delay_ms = 0
+
+    results = []
+    try:
+        for size in args.sizes:
+            command = [sys.executable, os.path.abspath(__file__), "--size", str(size)] + sys.argv[1:]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"{size} hosts: failed\n{completed.stderr}", file=sys.stderr)
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{size:>6} hosts: {result['median_wall_seconds']:.3f} s/cycle, "
+                  f"{result['median_probes_per_second']:.0f} probes/s, "
+                  f"{result['cpu_seconds_total']:.2f} s CPU, {result['peak_rss_kb'] / 1024:.1f} MB peak RSS, "
+                  f"trim_log {result['trim_log_seconds'] * 1000:.1f} ms")
+    finally:
+        if args.netem_delay_ms:
+            netem("del", args.netem_delay_ms)
+
+    report = {
+        "benchmark": "fleet",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {k: v for k, v in vars(args).items() if k not in ("size", "output")},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Startup benchmark for the server checker.
+
+Each run launches a fresh interpreter in a temporary working directory
+with one reachable stand-in host and measures, from just before the
+interpreter is spawned:
+
+    import        `import server_checker` finished
+    first_check   the first check cycle has reported its results (headless engine)
+    window        the Tk window is first viewable (GUI; skipped when no display is available)
+
+It also records which optional packages (NumPy, Pillow, pystray, winshell,
+win32com) had been imported at that point, to confirm they load lazily.
+
+    python benchmarks/bench_startup.py --runs 10 --output startup_results.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPTIONAL_MODULES = ["numpy", "PIL", "pystray", "winshell", "pythoncom", "win32com"]
+PHASES = ["import", "first_check", "window"]
+WINDOW_TIMEOUT_SECONDS = 10
+
+
+# --- Worker ---
+def loaded_optional_modules():
+    return [name for name in OPTIONAL_MODULES if name in sys.modules]
+
+def run_phase(phase, spawned_at):
+    """Runs one phase in this fresh interpreter.
+
+    Returns seconds since `spawned_at` (None if the phase can't run here),
+    the optional modules loaded by then and why the phase was skipped.
+    """
+    sys.path.insert(0, REPO_DIR)
+    import server_checker
+
+    if phase == "import":
+        return time.time() - spawned_at, loaded_optional_modules(), None
+
+    if phase == "first_check":
+        import threading
+
+        finished = threading.Event()
+        engine = server_checker.MonitorEngine(on_results=lambda results: finished.set())
+        engine.coordinator.start()
+        engine.run_ping(engine.servers)
+        finished.wait()
+        elapsed = time.time() - spawned_at
+        engine.stop()
+        return elapsed, loaded_optional_modules(), None
+
+    if server_checker.tk is None:
+        return None, loaded_optional_modules(), "tkinter is not available"
+    try:
+        root = server_checker.tk.Tk()
+    except server_checker.tk.TclError:
+        return None, loaded_optional_modules(), "no display"
+    # Errors here fail the run (non-zero exit) rather than being reported as skipped
+    app = server_checker.ServerMonitorApp(root)
+    if app.start_minimized_var.get():
+        return None, loaded_optional_modules(), "start_minimized is set"
+    # Pump Tk until the window manager has actually mapped the window
+    deadline = time.monotonic() + WINDOW_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        root.update_idletasks()
+        root.update()
+        if root.winfo_viewable():
+            elapsed = time.time() - spawned_at
+            root.destroy()
+            return elapsed, loaded_optional_modules(), None
+        time.sleep(0.001)
+    root.destroy()
+    return None, loaded_optional_modules(), "window was never mapped"
+
+
+# --- Driver ---
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+def run_worker(phase, workdir):
+    command = [sys.executable, os.path.abspath(__file__), "--phase", phase, "--spawned-at", repr(time.time())]
+    completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f"{phase}: failed\n{completed.stderr}", file=sys.stderr)
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server checker startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=PHASES)
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--phase", choices=PHASES, help=argparse.SUPPRESS)
+    parser.add_argument("--spawned-at", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase is not None:
+        # Worker mode: one measurement per interpreter, result as JSON on stdout
+        elapsed, modules, skipped = run_phase(args.phase, args.spawned_at)
+        print(json.dumps({"seconds": elapsed, "optional_modules": modules, "skipped": skipped}))
+        sys.stdout.flush()
+        os._exit(0)  # skip joining the engine's and tray's daemon threads
+
+    # One stand-in host that accepts connections, so the first cycle is quick and succeeds
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(64)
+    workdir = tempfile.mkdtemp(prefix="server-check-startup-")
+    with open(os.path.join(workdir, "servers.json"), "w", encoding="utf-8") as f:
+        json.dump([{"host": "127.0.0.1", "probe": "tcp", "port": listener.getsockname()[1]}], f)
+    with open(os.path.join(workdir, "settings.json"), "w", encoding="utf-8") as f:
+        json.dump({"confirm_delay_seconds": 0}, f)
+
+    results = {}
+    try:
+        for phase in args.phases:
+            runs = [run_worker(phase, workdir) for _ in range(args.runs)]
+            seconds = [run["seconds"] for run in runs if run and run["seconds"] is not None]
+            failed = sum(1 for run in runs if run is None)
+            skipped = sorted({run["skipped"] for run in runs if run and run["skipped"]})
+            measured = [run for run in runs if run]
+            results[phase] = {
+                "runs": seconds,
+                "median_seconds": median(seconds),
+                "failed_runs": failed,
+                "skipped": skipped,
+                "optional_modules": measured[-1]["optional_modules"] if measured else None
+            }
+            if seconds:
+                print(f"{phase:>12}: {median(seconds) * 1000:.1f} ms median over {len(seconds)} runs, "
+                      f"optional modules loaded: {', '.join(results[phase]['optional_modules']) or 'none'}")
+            elif failed:
+                print(f"{phase:>12}: FAILED in {failed} of {len(runs)} runs")
+            else:
+                print(f"{phase:>12}: skipped ({', '.join(skipped)})")
+    finally:
+        listener.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "startup",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {"runs": args.runs},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,109 +1,3059 @@
-import tkinter as tk
-from tkinter import messagebox
 import subprocess
 import platform
 import json
 import datetime
 import socket
 import os
-from PIL import Image, ImageDraw
-import pystray
 import threading
 import time
 import shutil
-import winshell
-import pythoncom
-from win32com.client import Dispatch
+import re
+import struct
+import errno
+import itertools
+import argparse
+import heapq
+import array
+import uuid
+import math
+import warnings
+import queue
+import importlib
+import hashlib
+import hmac
+import bisect
+import socketserver
+import csv
+import sqlite3
+import ssl
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import gzip
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import sys
 
+# The GUI is optional so the engine also runs headless. Tray, NumPy and Windows
+# integrations are imported on first use (see optional_import) to keep startup fast
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+except ImportError:
+    tk = None
+
 # --- Setup ---
 script_dir = os.path.dirname(os.path.realpath(__file__)) if '__file__' in globals() else os.getcwd()
-os.chdir(script_dir)
 
 LOG_FILE = "ping_log.txt"
 SERVERS_FILE = "servers.json"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 DEFAULT_INTERVAL_SECONDS = 3600
+DEFAULT_RETRY_SECONDS = 60
+DEFAULT_JITTER_FRACTION = 0.05
+DEFAULT_CONFIRM_FAILURES = 3
+DEFAULT_CONFIRM_WINDOW = 5
+DEFAULT_CONFIRM_DELAY_SECONDS = 1
+DEFAULT_FLAP_WINDOW = 20
+DEFAULT_FLAP_THRESHOLD = 0.4
+MIN_FLAP_CHANGES = 3  # a single outage and recovery is two changes, never a flap
+DEFAULT_LATENCY_WINDOW = 100
+MIN_LATENCY_SAMPLES = 5
 SETTINGS_FILE = "settings.json"
+HISTORY_FILE = "history.jsonl"
+LOG_DIR = "logs"
+LOG_RETENTION_DAYS = 30
+LOG_VIEWER_LINES = 100
+ROLLUP_FILE = os.path.join(LOG_DIR, "rollups.db")
+ROLLUP_FLUSH_SECONDS = 60
+ROLLUP_MAX_PENDING = 100000
+DEFAULT_ROLLUP_HOURLY_DAYS = 31
+DEFAULT_ROLLUP_DAILY_DAYS = 3650
+DEFAULT_SLA_TARGET_PCT = 99.9
+OUTBOX_FILE = "alert_outbox.json"
+DEFAULT_SMTP_HOST = "smtp.office365.com"
+DEFAULT_SMTP_PORT = 587
+DEFAULT_ALERT_COALESCE_SECONDS = 30
+MAX_OUTBOX_ALERTS = 1000
+SMTP_IDLE_SECONDS = 300
+RESULT_COLUMNS = (
+    ("status", "Status", 110),
+    ("rtt", "RTT (ms)", 70),
+    ("p50", "p50", 60),
+    ("p95", "p95", 60),
+    ("p99", "p99", 60),
+    ("loss", "Loss %", 60)
+)
+RESULT_STATE_ORDER = {"offline": 0, "dns": 1, "online": 2}
+DEFAULT_METRICS_BIND = "127.0.0.1"
+DEFAULT_TRACE_CYCLES = 20
+TRACE_DIR = "traces"
+DEFAULT_PROBE_TIMEOUT_SECONDS = 4
+DEFAULT_MAX_IN_FLIGHT = 32
+DEFAULT_PROBE_BACKEND = "auto"
+DEFAULT_TCP_PORT = 80
+DEFAULT_DNS_TTL_SECONDS = 300
+DEFAULT_DNS_NEGATIVE_TTL_SECONDS = 30
+DEFAULT_DNS_MAX_STALE_SECONDS = 900  # how long a last good address outlives failed lookups
+DNS_REFRESH_WORKERS = 8
+DEFAULT_HTTP_PATH = "/"
+DEFAULT_HTTP_IDLE_SECONDS = 60
+DEFAULT_CERT_WARN_DAYS = 14
+HTTP_MAX_BODY_BYTES = 1024 * 1024  # larger bodies are cut off and their connection isn't reused
+HTTP_BACKENDS = ("http", "https")
+DEFAULT_CONNECTIVITY_SENTINELS = ["8.8.8.8:53", "1.1.1.1:53"]
+DEFAULT_CONNECTIVITY_TTL_SECONDS = 30
+DEFAULT_CONNECTIVITY_TIMEOUT_SECONDS = 3
+OFFLINE_RECHECK_SECONDS = 5
+DEFAULT_AGGREGATOR_PORT = 9400
+DEFAULT_AGGREGATOR_BIND = "127.0.0.1"
+DEFAULT_RING_REPLICAS = 100
+DEFAULT_INVENTORY_POLL_SECONDS = 2
+DEFAULT_IMPORT_PROBE_RATE = 50  # first probes per second when many servers are added at once
+INVENTORY_COLUMNS = ["host", "group", "tags"]
+SMTP_PASSWORD_ENV = "SERVER_CHECKER_SMTP_PASSWORD"
+
+_optional_modules = {}
+
+def optional_import(name):
+    """Imports `name` on first use and caches it; returns None if it can't be loaded."""
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except Exception:
+            # Not only ImportError: pystray raises its backend's errors when no display is available
+            _optional_modules[name] = None
+    return _optional_modules[name]
 
 # --- Load/Save Servers ---
-def load_servers():
+# An entry in servers.json is either a plain hostname or a dict such as
+# {"host": "v-fleetfocus", "probe": "tcp", "port": 443}.
+def server_entry_host(entry):
+    return entry["host"] if isinstance(entry, dict) else entry
+
+def load_server_entries():
     if not os.path.exists(SERVERS_FILE):
         with open(SERVERS_FILE, "w", encoding="utf-8") as f:
             json.dump(["v-fleetfocus", "v-fleetfocustest", "v-cnbfuel"], f, indent=4)
     with open(SERVERS_FILE, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def save_servers(server_list):
+def server_entries(server_list, server_options=None):
+    server_options = server_options or {}
+    entries = []
+    for s in server_list:
+        if server_options.get(s):
+            entries.append(dict(host=s, **server_options[s]))
+        else:
+            entries.append(s)
+    return entries
+
+def save_servers(server_list, server_options=None):
+    entries = server_entries(server_list, server_options)
     with open(SERVERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(server_list, f, indent=4)
+        json.dump(entries, f, indent=4)
 
-# --- Ping ---
-def is_online(host):
-    param = "-n" if platform.system().lower() == "windows" else "-c"
-    command = ["ping", param, "1", host]
+# The inventory can also be a CSV file with a "host" column, optional
+# "group" and "tags" (separated by ";") columns, and any per-server option
+# as a further column (probe, port, interval, latency_threshold_ms, ...)
+def parse_inventory_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def load_csv_inventory(path):
+    entries = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            host = (row.pop("host", None) or "").strip()
+            if not host:
+                continue
+            options = {}
+            for key, value in row.items():
+                if not key or not value or not value.strip():
+                    continue
+                key, value = key.strip(), value.strip()
+                if key == "tags":
+                    options[key] = [tag.strip() for tag in value.split(";") if tag.strip()]
+                elif key == "group":
+                    options[key] = value
+                else:
+                    options[key] = parse_inventory_value(value)
+            entries.append(dict(host=host, **options) if options else host)
+    return entries
+
+def save_csv_inventory(path, server_list, server_options):
+    columns = list(INVENTORY_COLUMNS)
+    for s in server_list:
+        columns += [k for k in server_options.get(s, {}) if k not in columns]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        for s in server_list:
+            row = dict(server_options.get(s, {}), host=s)
+            for key, value in row.items():
+                if isinstance(value, list):
+                    row[key] = ";".join(str(v) for v in value)  # read back by _option_list / the tags column
+            writer.writerow(row)
+
+def load_inventory(path=SERVERS_FILE):
+    """Returns the servers.json-style entries of a JSON or CSV inventory."""
+    if path.lower().endswith(".csv"):
+        return load_csv_inventory(path)
+    if path == SERVERS_FILE:
+        return load_server_entries()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_inventory(path, server_list, server_options):
+    if path.lower().endswith(".csv"):
+        save_csv_inventory(path, server_list, server_options)
+    elif path == SERVERS_FILE:
+        save_servers(server_list, server_options)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(server_entries(server_list, server_options), f, indent=4)
+
+def split_entries(entries):
+    """Returns (hosts in order, host -> options) for inventory entries; repeated hosts are dropped."""
+    servers = []
+    options = {}
+    seen = set()
+    for entry in entries:
+        host = server_entry_host(entry)
+        if host in seen:
+            continue
+        seen.add(host)
+        servers.append(host)
+        if isinstance(entry, dict) and len(entry) > 1:
+            options[host] = {k: v for k, v in entry.items() if k != "host"}
+    return servers, options
+
+def probe_settings(options):
+    """The options that change how a host is probed, as opposed to labels like group and tags."""
+    return {k: v for k, v in (options or {}).items() if k not in ("group", "tags")}
+
+class InventoryWatcher:
+    """Polls the inventory file and calls `on_change(entries)` when it changes on disk.
+
+    Compares modification time and size every `interval` seconds, so it
+    needs no extra package. A file that fails to parse (for example while
+    an editor is still writing it) is skipped until it changes again.
+    """
+
+    def __init__(self, path, on_change, interval=DEFAULT_INVENTORY_POLL_SECONDS):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.stamp = self._stamp()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def mark_current(self):
+        """Called after the checker saved the file itself, so the write isn't reloaded."""
+        self.stamp = self._stamp()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, daemon=True)
+            self.thread.start()
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            stamp = self._stamp()
+            if stamp is None or stamp == self.stamp:
+                continue
+            self.stamp = stamp
+            try:
+                entries = load_inventory(self.path)
+            except (OSError, ValueError, KeyError, csv.Error) as e:
+                print(f"Failed to reload {self.path}:", e)
+                continue
+            self.on_change(entries)
+
+    def stop(self):
+        self.stop_event.set()
+
+# --- Probes ---
+# `error` is None for a normal up/down answer and "dns" when the name
+# could not be resolved, which is reported apart from an unreachable host.
+# HTTP(S) checks also fail with "http" (unexpected status or body) or "tls",
+# explained in `detail`, and report per-stage `timings` in milliseconds and
+# the days left on the server certificate in `cert_days`.
+ProbeResult = namedtuple("ProbeResult", ["online", "rtt_ms", "error", "detail", "timings", "cert_days"],
+                         defaults=[None, None, None, None])
+
+PROBE_ERROR_DNS = "dns"
+PROBE_ERROR_HTTP = "http"
+PROBE_ERROR_TLS = "tls"
+
+PING_TIME_PATTERN = re.compile(r"time[=<]\s*([\d.]+)\s*ms", re.IGNORECASE)
+
+# None until the first ICMP probe tells us whether the OS allows
+# unprivileged ICMP datagram sockets
+_icmp_supported = None
+_icmp_sequence = itertools.count(1)
+# Socket-creation errors meaning the OS doesn't allow unprivileged ICMP at all
+ICMP_UNSUPPORTED_ERRNOS = {
+    getattr(errno, name) for name in (
+        "EPERM", "EACCES", "EPROTONOSUPPORT", "ESOCKTNOSUPPORT", "EAFNOSUPPORT",
+        "WSAEACCES", "WSAEPROTONOSUPPORT", "WSAESOCKTNOSUPPORT", "WSAEAFNOSUPPORT"
+    ) if hasattr(errno, name)
+}
+
+def ping_probe(host, timeout=DEFAULT_PROBE_TIMEOUT_SECONDS):
+    system = platform.system().lower()
+    if system == "windows":
+        command = ["ping", "-n", "1", "-w", str(int(timeout * 1000)), host]
+    elif system == "darwin":
+        command = ["ping", "-c", "1", "-t", str(max(1, int(timeout))), host]
+    else:
+        command = ["ping", "-c", "1", "-W", str(max(1, int(timeout))), host]
 
     startupinfo = None
-    if platform.system().lower() == "windows":
+    if system == "windows":
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
 
     try:
+        start = time.perf_counter()
         result = subprocess.run(
             command,
-            stdout=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
             stderr=subprocess.DEVNULL,
-            startupinfo=startupinfo
+            startupinfo=startupinfo,
+            timeout=timeout + 1,
+            text=True,
+            errors="replace"
         )
-        return result.returncode == 0
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            return ProbeResult(False, None)
+        match = PING_TIME_PATTERN.search(result.stdout or "")
+        return ProbeResult(True, float(match.group(1)) if match else elapsed_ms)
     except:
+        return ProbeResult(False, None)
+
+def _icmp_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def icmp_probe(host, timeout=DEFAULT_PROBE_TIMEOUT_SECONDS):
+    """Sends one echo request over an unprivileged ICMP datagram socket.
+
+    Raises OSError only when the OS does not allow such sockets, so the
+    caller can fall back to the ping subprocess. Errors reaching one host
+    (unreachable network, no route, ...) just mean that host is down.
+    """
+    try:
+        address = socket.gethostbyname(host)
+    except OSError:
+        return ProbeResult(False, None)
+
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except OSError as e:
+        if e.errno in ICMP_UNSUPPORTED_ERRNOS:
+            raise
+        return ProbeResult(False, None)  # e.g. out of file descriptors; try again next time
+    try:
+        sequence = next(_icmp_sequence) & 0xFFFF
+        identifier = os.getpid() & 0xFFFF
+        payload = b"server-check"
+        header = struct.pack("!BBHHH", 8, 0, 0, identifier, sequence)
+        packet = struct.pack("!BBHHH", 8, 0, _icmp_checksum(header + payload), identifier, sequence) + payload
+
+        start = time.perf_counter()
+        deadline = start + timeout
+        sock.sendto(packet, (address, 0))
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return ProbeResult(False, None)
+            sock.settimeout(remaining)
+            try:
+                data, _ = sock.recvfrom(1024)
+            except socket.timeout:
+                return ProbeResult(False, None)
+            # Linux strips the IP header on ICMP datagram sockets, macOS keeps it
+            if data and data[0] >> 4 == 4:
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, _, reply_sequence = struct.unpack("!BBHHH", data[:8])
+            if icmp_type == 0 and reply_sequence == sequence:
+                return ProbeResult(True, (time.perf_counter() - start) * 1000)
+    except OSError:
+        return ProbeResult(False, None)
+    finally:
+        sock.close()
+
+def tcp_probe(host, port=DEFAULT_TCP_PORT, timeout=DEFAULT_PROBE_TIMEOUT_SECONDS):
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return ProbeResult(True, (time.perf_counter() - start) * 1000)
+    except OSError:
+        return ProbeResult(False, None)
+
+def _elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+def _option_list(value):
+    """Accepts a list, a single value or a ";"-separated string (as in CSV inventories)."""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [parse_inventory_value(v.strip()) for v in value.split(";") if v.strip()]
+    return [value]
+
+class HttpPool:
+    """Keep-alive connections and TLS sessions shared by all HTTP(S) checks.
+
+    After a check its connection goes back to the pool, so the next check
+    of the same host sends its request right away without a new connect or
+    TLS handshake. When a new TLS connection is needed anyway (first check,
+    or the server closed the idle connection) it resumes the host's last
+    TLS session, which skips the certificate exchange. Connections idle
+    for longer than `idle_seconds` are closed; servers drop idle keep-alive
+    connections after about a minute anyway, so hosts checked less often
+    than that only gain the session resumption.
+    """
+
+    def __init__(self, idle_seconds=DEFAULT_HTTP_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.idle = {}  # key -> [(connection, returned_at)], most recent last
+        self.sessions = {}  # key -> ssl.SSLSession
+        self.cert_expiry = {}  # key -> Unix time the server certificate expires
+        self.contexts = {}
+        self.lock = threading.Lock()
+        self.pruned_at = time.monotonic()
+
+    def context(self, verify):
+        # Sessions can only be resumed through the context that created them
+        with self.lock:
+            if verify not in self.contexts:
+                context = ssl.create_default_context()
+                if not verify:
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                self.contexts[verify] = context
+            return self.contexts[verify]
+
+    def connect(self, key, timeout, timings):
+        """Opens a new connection for `key`, recording connect and TLS times in `timings`."""
+        scheme, host, address, port, verify = key
+        start = time.perf_counter()
+        sock = socket.create_connection((address, port), timeout=timeout)
+        timings["connect"] = _elapsed_ms(start)
+        if scheme == "https":
+            start = time.perf_counter()
+            try:
+                sock = self.context(verify).wrap_socket(sock, server_hostname=host, session=self.sessions.get(key))
+            except BaseException:
+                sock.close()
+                raise
+            timings["tls"] = _elapsed_ms(start)
+            cert = sock.getpeercert()  # empty when verification is off
+            if cert.get("notAfter"):
+                self.cert_expiry[key] = ssl.cert_time_to_seconds(cert["notAfter"])
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        connection.default_port = 443 if scheme == "https" else 80  # keeps the Host header free of the default port
+        connection.auto_open = 0  # never let http.client reconnect behind our back without TLS
+        connection.sock = sock
+        return connection
+
+    def take(self, key):
+        """Returns an idle connection for `key`, or None."""
+        now = time.monotonic()
+        with self.lock:
+            connections = self.idle.get(key)
+            while connections:
+                connection, returned_at = connections.pop()
+                if now - returned_at < self.idle_seconds:
+                    return connection
+                connection.close()
+        return None
+
+    def release(self, key, connection):
+        now = time.monotonic()
+        sock = connection.sock
+        with self.lock:
+            if isinstance(sock, ssl.SSLSocket) and sock.session is not None:
+                self.sessions[key] = sock.session
+            self.idle.setdefault(key, []).append((connection, now))
+            if now - self.pruned_at > self.idle_seconds / 2:
+                self.pruned_at = now
+                self._prune(now)
+
+    def _prune(self, now):
+        for key in list(self.idle):
+            connections = self.idle[key]
+            while connections and now - connections[0][1] >= self.idle_seconds:
+                connections.pop(0)[0].close()
+            if not connections:
+                del self.idle[key]
+
+    def cert_days(self, key):
+        expires_at = self.cert_expiry.get(key)
+        return round((expires_at - time.time()) / 86400, 1) if expires_at is not None else None
+
+    def forget(self, host):
+        with self.lock:
+            for key in [k for k in set(self.idle) | set(self.sessions) | set(self.cert_expiry) if k[1] == host]:
+                for connection, _ in self.idle.pop(key, []):
+                    connection.close()
+                self.sessions.pop(key, None)
+                self.cert_expiry.pop(key, None)
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection, _ in connections:
+                    connection.close()
+            self.idle.clear()
+
+def http_probe(host, address, options=None, timeout=DEFAULT_PROBE_TIMEOUT_SECONDS, pool=None, timings=None):
+    """GETs the entry's "path" over a pooled connection and checks the answer.
+
+    The host is up if the status is one of "expect_status" (default: any
+    status below 400) and the body contains "expect_body" and matches the
+    regular expression "expect_body_regex" when they are set. `rtt_ms` is
+    the time to the first byte of the response, including connect and TLS
+    when no pooled connection was available. "verify_tls": false accepts
+    any certificate, but then its expiry can't be read.
+    """
+    options = options or {}
+    scheme = options.get("probe", "http")
+    port = int(options.get("port", 443 if scheme == "https" else 80))
+    verify = options.get("verify_tls", True) not in (False, 0, "false", "no")
+    key = (scheme, host, address, port, verify)
+    timings = dict(timings or {})
+    owned = pool is None
+    pool = pool or HttpPool()
+
+    try:
+        for attempt in (1, 2):
+            connection = pool.take(key)
+            reused = connection is not None
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = pool.connect(key, timeout, timings)
+                request_start = time.perf_counter()
+                connection.request("GET", options.get("path", DEFAULT_HTTP_PATH), headers={"User-Agent": "ServerChecker"})
+                response = connection.getresponse()
+                timings["first_byte"] = _elapsed_ms(request_start)
+                rtt_ms = _elapsed_ms(start)
+                body = response.read(HTTP_MAX_BODY_BYTES)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                if connection is not None:
+                    connection.close()
+                if not reused or attempt == 2 or isinstance(e, socket.timeout):
+                    raise
+                # The server closed the idle connection; retry once on a fresh one
+    except ssl.SSLCertVerificationError as e:
+        return ProbeResult(False, None, PROBE_ERROR_TLS, e.verify_message, timings)
+    except ssl.SSLError as e:
+        return ProbeResult(False, None, PROBE_ERROR_TLS, e.reason or str(e), timings)
+    except (OSError, http.client.HTTPException):
+        return ProbeResult(False, None, None, None, timings)
+
+    # Only a fully read response leaves the connection ready for the next request
+    if response.isclosed() and not response.will_close and not owned:
+        pool.release(key, connection)
+    else:
+        connection.close()
+    cert_days = pool.cert_days(key) if scheme == "https" else None
+
+    expected = options.get("expect_status")
+    if expected is None and response.status >= 400 or expected is not None and response.status not in _option_list(expected):
+        return ProbeResult(False, None, PROBE_ERROR_HTTP, f"HTTP {response.status}", timings, cert_days)
+    # CSV inventories turn values such as "200" or "1.5" into numbers
+    expect_body = options.get("expect_body")
+    expect_regex = options.get("expect_body_regex")
+    text = body.decode("utf-8", "replace") if expect_body is not None or expect_regex is not None else ""
+    if expect_body is not None and str(expect_body) not in text:
+        return ProbeResult(False, None, PROBE_ERROR_HTTP, "body mismatch", timings, cert_days)
+    if expect_regex is not None and not re.search(str(expect_regex), text):
+        return ProbeResult(False, None, PROBE_ERROR_HTTP, "body mismatch", timings, cert_days)
+    return ProbeResult(True, rtt_ms, None, None, timings, cert_days)
+
+class DnsCache:
+    """Caches hostname lookups so probes don't hit the resolver every time.
+
+    Successful lookups are kept for `ttl` seconds and failures for
+    `negative_ttl` seconds. A background thread refreshes entries that
+    were used within the last two TTLs shortly before they expire, a few
+    lookups at a time; names no check asks for any more are left to
+    expire. If a refresh fails, the last good address is kept
+    and retried later, so a slow or flaky DNS server doesn't look like a
+    host outage. After `max_stale` seconds without a successful lookup the
+    name is reported as not resolving, so a deleted record shows up as a
+    DNS failure instead of probing an address that may have been reused.
+    """
+
+    def __init__(self, ttl=DEFAULT_DNS_TTL_SECONDS, negative_ttl=DEFAULT_DNS_NEGATIVE_TTL_SECONDS,
+                 max_stale=DEFAULT_DNS_MAX_STALE_SECONDS):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_stale = max_stale
+        self.entries = {}  # host -> (address or None, expires_at)
+        self.resolved_at = {}  # host -> time of the last successful lookup
+        self.used_at = {}  # host -> time a probe last asked for the address
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.executor = None
+
+    def _lookup(self, host):
+        try:
+            address = socket.gethostbyname(host)
+            expires_at = time.time() + self.ttl
+        except OSError:
+            address = None
+            expires_at = time.time() + self.negative_ttl
+        with self.lock:
+            previous = self.entries.get(host)
+            if address is not None:
+                self.resolved_at[host] = time.time()
+            elif previous and previous[0] and time.time() - self.resolved_at.get(host, 0) < self.max_stale:
+                # Serve the stale address instead of failing every probe while DNS is down
+                address = previous[0]
+            self.entries[host] = (address, expires_at)
+        return address
+
+    def resolve(self, host):
+        """Returns the cached IPv4 address of `host`, or None if it doesn't resolve."""
+        self.used_at[host] = time.time()
+        entry = self.entries.get(host)
+        if entry and entry[1] > time.time():
+            return entry[0]
+        return self._lookup(host)
+
+    def forget(self, host):
+        with self.lock:
+            self.entries.pop(host, None)
+            self.resolved_at.pop(host, None)
+            self.used_at.pop(host, None)
+
+    def start(self):
+        if self.thread is None:
+            self.executor = ThreadPoolExecutor(max_workers=DNS_REFRESH_WORKERS, thread_name_prefix="dns")
+            self.thread = threading.Thread(target=self.refresh_loop, daemon=True)
+            self.thread.start()
+
+    def refresh_loop(self):
+        while not self.stop_event.wait(5):
+            now = time.time()
+            soon = now + min(30, self.ttl / 5)
+            recently = now - 2 * self.ttl
+            with self.lock:
+                expiring = [h for h, (_, expires_at) in self.entries.items()
+                            if expires_at <= soon and self.used_at.get(h, 0) >= recently]
+            # Wait for this batch so a slow resolver can't pile up lookups
+            list(self.executor.map(self._lookup, expiring))
+
+    def stop(self):
+        self.stop_event.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+# --- Connectivity ---
+def parse_sentinel(sentinel):
+    host, _, port = sentinel.rpartition(":")
+    if not host or not port.isdigit():
+        return sentinel.strip("[]"), 53
+    return host.strip("[]"), int(port)
+
+class ConnectivityWatcher:
+    """Tracks whether this machine has network access, from a background thread.
+
+    All `sentinels` ("host:port") are connected to in parallel and the first
+    success counts, so one firewalled address doesn't hold up the answer.
+    The result is cached for `ttl` seconds, and for only
+    OFFLINE_RECHECK_SECONDS while offline so recovery is noticed quickly.
+    A successful check cycle also refreshes it via `report_reachable`, and
+    when every sentinel fails `fallback()` (if given) gets the last word, so
+    a network that blocks public addresses but reaches the monitored
+    servers isn't treated as offline. The check path just reads
+    `connected`. `on_change(connected, since)` is called when the state flips.
+
+    With no sentinels the watcher always reports connected.
+    """
+
+    def __init__(self, sentinels=None, ttl=DEFAULT_CONNECTIVITY_TTL_SECONDS,
+                 timeout=DEFAULT_CONNECTIVITY_TIMEOUT_SECONDS, on_change=None, fallback=None, tracer=None):
+        self.sentinels = [parse_sentinel(s) for s in (DEFAULT_CONNECTIVITY_SENTINELS if sentinels is None else sentinels)]
+        self.ttl = ttl
+        self.timeout = timeout
+        self.on_change = on_change
+        self.fallback = fallback
+        self.tracer = tracer or CycleTracer(0)
+        self.connected = True  # assume online until a probe says otherwise
+        self.since = time.time()
+        self.checked_at = 0
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.sentinels)), thread_name_prefix="sentinel")
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _connect(self, address):
+        with socket.create_connection(address, timeout=self.timeout):
+            return True
+
+    def probe(self):
+        """Connects to every sentinel at once; True as soon as one answers."""
+        if not self.sentinels:
+            return True
+        trace = self.tracer.begin("connectivity")
+        with trace.span("sentinels"):
+            pending = {self.executor.submit(self._connect, address) for address in self.sentinels}
+            reachable = False
+            while pending and not reachable:
+                done, pending = wait(pending, timeout=self.timeout + 1, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                reachable = any(future.exception() is None for future in done)
+        if not reachable and self.fallback:
+            with trace.span("fallback"):
+                reachable = self.fallback()
+        self.tracer.finish(trace)
+        return reachable
+
+    def update(self, connected):
+        self.checked_at = time.time()
+        if connected == self.connected:
+            return
+        since = self.since
+        self.connected = connected
+        self.since = self.checked_at
+        if self.on_change:
+            self.on_change(connected, since)
+
+    def report_reachable(self):
+        """Called when a check cycle got answers, which proves the network is up."""
+        self.update(True)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, daemon=True)
+            self.thread.start()
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            ttl = self.ttl if self.connected else min(self.ttl, OFFLINE_RECHECK_SECONDS)
+            if time.time() - self.checked_at >= ttl:
+                self.update(self.probe())
+            self.stop_event.wait(1)
+
+    def stop(self):
+        self.stop_event.set()
+        self.executor.shutdown(wait=False)
+
+def is_ip_address(host):
+    try:
+        socket.inet_aton(host)
+        return host.count(".") == 3
+    except OSError:
         return False
 
+def resolve_address(host):
+    try:
+        return socket.gethostbyname(host)
+    except OSError:
+        return None
+
+def probe_host(host, options=None, timeout=DEFAULT_PROBE_TIMEOUT_SECONDS, resolver=None, http_pool=None):
+    """Probes one host with the backend chosen in its servers.json entry.
+
+    "auto" and "icmp" use an in-process ICMP socket where the OS allows it
+    and fall back to the ping subprocess otherwise; "tcp" connects to the
+    entry's port; "http" and "https" run an HTTP check (see http_probe)
+    over connections kept in `http_pool`; "ping" always runs the
+    subprocess. With a `resolver` (a DnsCache) the name is resolved once
+    up front and the probe targets the cached address.
+    """
+    global _icmp_supported
+    options = options or {}
+    backend = options.get("probe", DEFAULT_PROBE_BACKEND)
+
+    target = host
+    timings = {}
+    if not is_ip_address(host) and (resolver is not None or backend in HTTP_BACKENDS):
+        start = time.perf_counter()
+        target = resolver.resolve(host) if resolver is not None else resolve_address(host)
+        timings["dns"] = _elapsed_ms(start)
+        if target is None:
+            return ProbeResult(False, None, PROBE_ERROR_DNS)
+
+    if backend in HTTP_BACKENDS:
+        return http_probe(host, target, options, timeout, http_pool, timings)
+    if backend == "tcp":
+        return tcp_probe(target, options.get("port", DEFAULT_TCP_PORT), timeout)
+    if backend in ("auto", "icmp") and _icmp_supported is not False:
+        try:
+            result = icmp_probe(target, timeout)
+            _icmp_supported = True
+            return result
+        except OSError:
+            _icmp_supported = False
+    return ping_probe(target, timeout)
+
+def is_online(host, timeout=DEFAULT_PROBE_TIMEOUT_SECONDS):
+    return probe_host(host, timeout=timeout).online
+
+class ProbeEngine:
+    """Probes many hosts at once with a bounded number of probes in flight.
+
+    A full cycle takes roughly as long as the slowest host instead of the
+    sum of every host's timeout.
+    """
+
+    def __init__(self, timeout=DEFAULT_PROBE_TIMEOUT_SECONDS, max_in_flight=DEFAULT_MAX_IN_FLIGHT, server_options=None, resolver=None,
+                 http_idle_seconds=DEFAULT_HTTP_IDLE_SECONDS):
+        self.timeout = timeout
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.server_options = server_options if server_options is not None else {}
+        self.resolver = resolver
+        self.http_pool = HttpPool(http_idle_seconds)
+        self.in_flight = 0
+        self.in_flight_lock = threading.Lock()
+        self.answered_at = 0  # time any host last answered a probe
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="probe")
+
+    def probe(self, host):
+        with self.in_flight_lock:
+            self.in_flight += 1
+        try:
+            result = probe_host(host, self.server_options.get(host), self.timeout, self.resolver, self.http_pool)
+            if result.online:
+                self.answered_at = time.time()
+            return result
+        finally:
+            with self.in_flight_lock:
+                self.in_flight -= 1
+
+    def run(self, hosts, trace=None):
+        # Results keep the order of `hosts` so logs and alerts read as before
+        probe = self.probe if trace is None else trace.time_probe(self.probe)
+        futures = [(host, self.executor.submit(probe, host)) for host in hosts]
+        results = {}
+        for host, future in futures:
+            try:
+                results[host] = future.result()
+            except Exception:
+                results[host] = ProbeResult(False, None)
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.http_pool.close()
+
+# --- Log Segments ---
+class SegmentedLog:
+    """Append-only log split into one file per day.
+
+    `logs/ping_log.txt` is stored as `logs/ping_log-2024-05-01.txt`,
+    `logs/ping_log-2024-05-02.txt`, ... so retention only has to delete
+    whole expired segments and never rewrites live data. Closed segments
+    may be gzipped in place.
+    """
+
+    def __init__(self, directory, filename):
+        self.directory = directory
+        self.stem, self.suffix = os.path.splitext(filename)
+        self.pattern = re.compile(re.escape(self.stem) + r"-(\d{4}-\d{2}-\d{2})" + re.escape(self.suffix) + r"(\.gz)?$")
+        self.lock = threading.Lock()
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{self.stem}-{day.isoformat()}{self.suffix}")
+
+    def current_path(self):
+        return self.path_for(datetime.date.today())
+
+    def append(self, data):
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.current_path(), "a", encoding="utf-8") as f:
+                f.write(data)
+
+    def segments(self):
+        """Returns (day, path) for every segment, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            match = self.pattern.match(name)
+            if not match:
+                continue
+            try:
+                day = datetime.date.fromisoformat(match.group(1))
+            except ValueError:
+                continue
+            found.append((day, os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def open_segment(self, path):
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt", encoding="utf-8")
+        return open(path, "r", encoding="utf-8")
+
+    def expire(self, retention_days=LOG_RETENTION_DAYS):
+        cutoff = datetime.date.today() - datetime.timedelta(days=retention_days)
+        for day, path in self.segments():
+            if day < cutoff:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print("Failed to remove old log segment:", e)
+
+    def compress_closed(self):
+        today = datetime.date.today()
+        for day, path in self.segments():
+            if day >= today or path.endswith(".gz"):
+                continue
+            temp_path = path + ".gz.tmp"
+            try:
+                with open(path, "rb") as src, gzip.open(temp_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                # Swap in the compressed copy before dropping the original so a crash never loses data
+                os.replace(temp_path, path + ".gz")
+                os.remove(path)
+            except OSError as e:
+                print("Failed to compress log segment:", e)
+
+TEXT_LOG = SegmentedLog(LOG_DIR, LOG_FILE)
+
+# --- History ---
+class HistoryStore:
+    """Append-only JSONL history of check cycles and server-list changes.
+
+    `append` writes all of its records with one open and one write, so a
+    whole cycle costs the same few syscalls whatever the fleet size.
+    Records are kept in daily segments under `logs/`.
+    """
+
+    def __init__(self, segments=None):
+        self.segments = segments or SegmentedLog(LOG_DIR, HISTORY_FILE)
+
+    def append(self, *records):
+        data = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+        self.segments.append(data)
+
+    def read(self):
+        for day, path in self.segments.segments():
+            try:
+                with self.segments.open_segment(path) as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue  # partial line left by a crash mid-write
+            except (OSError, EOFError) as e:
+                print("Failed to read history segment:", e)
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+def check_record(probes, events=None, stats=None):
+    results = {}
+    for server, probe in probes.items():
+        results[server] = {"online": probe.online, "rtt_ms": _round(probe.rtt_ms)}
+        if probe.error:
+            results[server]["error"] = probe.error
+        if probe.detail:
+            results[server]["detail"] = probe.detail
+        if probe.timings:
+            results[server]["timings"] = {stage: _round(ms) for stage, ms in probe.timings.items()}
+        if probe.cert_days is not None:
+            results[server]["cert_days"] = probe.cert_days
+        host_stats = (stats or {}).get(server)
+        if host_stats:
+            results[server].update(
+                p50=_round(host_stats.p50), p95=_round(host_stats.p95), p99=_round(host_stats.p99),
+                loss_pct=_round(host_stats.loss_pct, 1)
+            )
+    record = {"type": "check", "ts": datetime.datetime.now().strftime(DATE_FORMAT), "results": results}
+    if events:
+        record["events"] = events
+    return record
+
+def server_diff_record(added, removed, changed, total):
+    """One record per inventory change, listing only the hosts that differ."""
+    return {
+        "type": "server_diff",
+        "ts": datetime.datetime.now().strftime(DATE_FORMAT),
+        "added": list(added),
+        "removed": list(removed),
+        "changed": list(changed),
+        "total": total
+    }
+
+def note_record(text):
+    return {"type": "note", "ts": datetime.datetime.now().strftime(DATE_FORMAT), "text": text}
+
+def offline_record(started, ended, deferred):
+    """One record for a whole period without network access."""
+    return {
+        "type": "offline",
+        "ts": datetime.datetime.fromtimestamp(ended).strftime(DATE_FORMAT),
+        "from": datetime.datetime.fromtimestamp(started).strftime(DATE_FORMAT),
+        "seconds": round(ended - started),
+        "deferred": deferred
+    }
+
+def status_text(online, error=None, detail=None):
+    if online:
+        return "✅ ONLINE"
+    if error == PROBE_ERROR_DNS:
+        return "⚠️ DNS FAILED"
+    if error == PROBE_ERROR_TLS:
+        return "🔒 TLS FAILED"
+    if error == PROBE_ERROR_HTTP:
+        return f"❌ {(detail or 'HTTP ERROR').upper()}"
+    return "❌ OFFLINE"
+
+STAGE_LABELS = (("dns", "dns"), ("connect", "connect"), ("tls", "tls"), ("first_byte", "first byte"))
+
+def render_history_record(record):
+    """Renders one history record as the lines of the human-readable log."""
+    kind = record.get("type")
+    timestamp = record.get("ts", "")
+    lines = []
+    if kind == "check":
+        lines.append("")
+        lines.append(f"🔁 PING CHECK @ {timestamp}")
+        for server, result in record["results"].items():
+            line = f"{server:<25} | {status_text(result['online'], result.get('error'), result.get('detail'))}"
+            if result.get("rtt_ms") is not None:
+                line += f" | {result['rtt_ms']:.1f} ms"
+                if result.get("p95") is not None:
+                    line += f" (p95 {result['p95']:.1f} ms)"
+            if result.get("error") == PROBE_ERROR_TLS and result.get("detail"):
+                line += f" | {result['detail']}"
+            timings = result.get("timings")
+            if timings:
+                line += " | " + ", ".join(f"{label} {timings[stage]:.1f}" for stage, label in STAGE_LABELS
+                                          if timings.get(stage) is not None) + " ms"
+            if result.get("cert_days") is not None:
+                line += f" | cert {result['cert_days']:.0f} days"
+            lines.append(line)
+        lines.append("=" * 60)
+    elif kind == "server_change":
+        changes = [("+ Added", s) for s in record["added"]] + [("- Removed", s) for s in record["removed"]]
+        for action, affected_server in changes:
+            lines.append("")
+            lines.append(f"⚙️ SERVER LIST UPDATED @ {timestamp}")
+            lines.append(f"{action}: {affected_server}")
+            lines.append("Updated server list:")
+            for s in record["servers"]:
+                lines.append(f"- {s}")
+            lines.append("=" * 60)
+    elif kind == "server_diff":
+        lines.append("")
+        lines.append(f"⚙️ SERVER LIST UPDATED @ {timestamp}: +{len(record['added'])} added, "
+                     f"-{len(record['removed'])} removed, ~{len(record['changed'])} changed ({record['total']} servers)")
+        for action, key in (("+ Added", "added"), ("- Removed", "removed"), ("~ Changed", "changed")):
+            if record[key]:
+                lines.append(f"{action}: {', '.join(record[key])}")
+        lines.append("=" * 60)
+    elif kind == "note":
+        lines.append(record["text"])
+    elif kind == "offline":
+        minutes, seconds = divmod(record["seconds"], 60)
+        lines.append(f"🌐 NO INTERNET CONNECTION {record['from']} – {timestamp} ({minutes}m {seconds}s). "
+                     f"{record['deferred']} servers deferred.")
+    return lines
+
+# --- Rollups ---
+UptimeRow = namedtuple("UptimeRow", [
+    "host", "bucket", "checks", "up", "down", "uptime_pct", "avg_rtt_ms", "min_rtt_ms", "max_rtt_ms"
+])
+
+ROLLUP_UPSERT = """
+INSERT INTO rollups (host, period, bucket, up, down, rtt_count, rtt_sum, rtt_min, rtt_max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (period, bucket, host) DO UPDATE SET
+    up = up + excluded.up,
+    down = down + excluded.down,
+    rtt_count = rtt_count + excluded.rtt_count,
+    rtt_sum = rtt_sum + excluded.rtt_sum,
+    rtt_min = min(coalesce(rtt_min, excluded.rtt_min), coalesce(excluded.rtt_min, rtt_min)),
+    rtt_max = max(coalesce(rtt_max, excluded.rtt_max), coalesce(excluded.rtt_max, rtt_max))
+"""
+
+# Both bucket sizes start on local time, so whole days are made of whole
+# hours even in timezones with a half-hour offset
+def hour_start(ts):
+    return int(datetime.datetime.fromtimestamp(ts).replace(minute=0, second=0, microsecond=0).timestamp())
+
+def day_start(ts):
+    return int(datetime.datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+class RollupStore:
+    """Hourly and daily per-host check counts and RTT aggregates in SQLite.
+
+    Each cycle's results are added to in-memory buckets, which are upserted
+    in one transaction at most every ROLLUP_FLUSH_SECONDS. Uptime queries
+    then cost O(buckets) however many checks went into them. Hourly buckets
+    are kept for `hourly_days` and daily ones for `daily_days`, long after
+    the raw logs are trimmed. Uptime is the share of checks that found the
+    host online.
+    """
+
+    def __init__(self, path=ROLLUP_FILE, hourly_days=DEFAULT_ROLLUP_HOURLY_DAYS, daily_days=DEFAULT_ROLLUP_DAILY_DAYS):
+        self.path = path
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self.pending = {}  # (host, period, bucket) -> [up, down, rtt_count, rtt_sum, rtt_min, rtt_max]
+        self.flushed_at = time.time()
+        self.live_since = None  # timestamp of the first record this process added live
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        # Opened on first use so processes that never record (agents, --render-log) create no file
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            created = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rollups'").fetchone() is None
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS rollups (host TEXT NOT NULL, period TEXT NOT NULL, "
+                    "bucket INTEGER NOT NULL, up INTEGER NOT NULL, down INTEGER NOT NULL, "
+                    "rtt_count INTEGER NOT NULL, rtt_sum REAL NOT NULL, rtt_min REAL, rtt_max REAL, "
+                    "PRIMARY KEY (period, bucket, host)) WITHOUT ROWID"
+                )
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                if created:
+                    # History written before the store existed is folded in once by `backfill`.
+                    # Records are stamped to the second, so cut at a whole second; live records
+                    # added before the file was opened already count and must not be folded in again.
+                    before = self.live_since if self.live_since is not None else math.floor(time.time())
+                    conn.execute("INSERT INTO meta VALUES ('backfill_before', ?)", (str(before),))
+            self.conn = conn
+        return self.conn
+
+    def add(self, results, ts=None):
+        """Counts one check per host; `results` maps host -> (online, rtt_ms)."""
+        ts = time.time() if ts is None else ts
+        hour = hour_start(ts)
+        day = day_start(ts)
+        with self.lock:
+            for host, (online, rtt_ms) in results.items():
+                for key in ((host, "hour", hour), (host, "day", day)):
+                    bucket = self.pending.get(key)
+                    if bucket is None:
+                        bucket = self.pending[key] = [0, 0, 0, 0.0, None, None]
+                    bucket[0 if online else 1] += 1
+                    if rtt_ms is not None:
+                        bucket[2] += 1
+                        bucket[3] += rtt_ms
+                        bucket[4] = rtt_ms if bucket[4] is None else min(bucket[4], rtt_ms)
+                        bucket[5] = rtt_ms if bucket[5] is None else max(bucket[5], rtt_ms)
+            due = len(self.pending) >= ROLLUP_MAX_PENDING or time.time() - self.flushed_at >= ROLLUP_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def add_record(self, record, ts=None):
+        """Counts a history check record; without `ts` it is a live record, stamped by its own time."""
+        if record.get("type") != "check":
+            return
+        if ts is None:
+            ts = datetime.datetime.strptime(record["ts"], DATE_FORMAT).timestamp()
+            with self.lock:
+                if self.live_since is None:
+                    self.live_since = ts
+        self.add({host: (r["online"], r.get("rtt_ms")) for host, r in record.get("results", {}).items()}, ts)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.time()
+            if not pending:
+                return
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(ROLLUP_UPSERT, [key + tuple(values) for key, values in pending.items()])
+            except sqlite3.Error as e:
+                print("Failed to save rollups:", e)
+
+    def backfill(self, history):
+        """Folds check records written before this store existed into it, once."""
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'backfill_before'").fetchone()
+        if row is None:
+            return
+        before = float(row[0])
+        for record in history.read():
+            try:
+                ts = datetime.datetime.strptime(record.get("ts", ""), DATE_FORMAT).timestamp()
+            except ValueError:
+                continue
+            if ts < before:
+                self.add_record(record, ts)
+        self.flush()
+        with self.lock, conn:
+            conn.execute("DELETE FROM meta WHERE key = 'backfill_before'")
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        self.flush()
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM rollups WHERE period = 'hour' AND bucket < ?", (now - self.hourly_days * 86400,))
+            conn.execute("DELETE FROM rollups WHERE period = 'day' AND bucket < ?", (day_start(now - self.daily_days * 86400),))
+
+    def _ranges(self, start, end, granularity):
+        """(period, first bucket, end) ranges covering start..end with as few buckets as possible."""
+        if granularity == "hour" or (granularity is None and end - start <= 2 * 86400):
+            return [("hour", hour_start(start), end)]
+        if granularity == "day" or start < time.time() - self.hourly_days * 86400:
+            return [("day", day_start(start), end)]
+        # Whole days from the daily buckets, the partial days at either end from the hourly ones
+        first_day = start if start == day_start(start) else day_start(day_start(start) + 90000)
+        last_day = day_start(end)
+        if first_day >= last_day:
+            return [("hour", hour_start(start), end)]
+        return [("hour", hour_start(start), first_day), ("day", first_day, last_day), ("hour", last_day, end)]
+
+    def report(self, start, end=None, hosts=None, granularity=None):
+        """Uptime and RTT per host between `start` and `end` (Unix times) as UptimeRows.
+
+        By default there is one row per host. With `granularity` "hour" or
+        "day" there is one row per host and bucket.
+        """
+        end = time.time() if end is None else end
+        self.flush()
+        ranges = self._ranges(start, end, granularity)
+        columns = "host, " + ("bucket" if granularity else "NULL") + \
+            ", SUM(up), SUM(down), SUM(rtt_count), SUM(rtt_sum), MIN(rtt_min), MAX(rtt_max)"
+        where = " OR ".join("(period = ? AND bucket >= ? AND bucket < ?)" for _ in ranges)
+        sql = f"SELECT {columns} FROM rollups WHERE ({where})"
+        params = [value for r in ranges for value in r]
+        if hosts:
+            sql += f" AND host IN ({', '.join('?' * len(hosts))})"
+            params += list(hosts)
+        sql += " GROUP BY host" + (", bucket ORDER BY host, bucket" if granularity else " ORDER BY host")
+        with self.lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        report = []
+        for host, bucket, up, down, rtt_count, rtt_sum, rtt_min, rtt_max in rows:
+            checks = up + down
+            report.append(UptimeRow(
+                host, bucket, checks, up, down,
+                _round(100 * up / checks) if checks else None,
+                _round(rtt_sum / rtt_count) if rtt_count else None,
+                rtt_min, rtt_max
+            ))
+        return report
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+def report_rows(rows, sla_target=None):
+    """UptimeRows as dicts for export, with readable bucket times and an SLA verdict."""
+    exported = []
+    for row in rows:
+        data = row._asdict()
+        if row.bucket is None:
+            del data["bucket"]
+        else:
+            data["bucket"] = datetime.datetime.fromtimestamp(row.bucket).strftime(DATE_FORMAT)
+        if sla_target is not None:
+            data["sla_met"] = row.uptime_pct is not None and row.uptime_pct >= sla_target
+        exported.append(data)
+    return exported
+
+def export_report(rows, path, sla_target=None):
+    """Writes a report as CSV or JSON, chosen by the file extension."""
+    data = report_rows(rows, sla_target)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            json.dump(data, f, indent=4)
+        else:
+            writer = csv.DictWriter(f, list(data[0]) if data else list(UptimeRow._fields))
+            writer.writeheader()
+            writer.writerows(data)
+
+def parse_report_time(text, now=None):
+    """Accepts "7d", "24h", "90m" (that long ago) or a date/time such as "2026-10-01"."""
+    now = time.time() if now is None else now
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+    if text[:-1].isdigit() and text[-1:] in units:
+        return now - int(text[:-1]) * units[text[-1]]
+    for fmt in (DATE_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised time: {text}")
+
 # --- Logging ---
-def log_line(line=""):
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(line + "\n")
+def log_lines(lines):
+    if not lines:
+        return
+    TEXT_LOG.append("\n".join(lines) + "\n")
+
+def tail_lines(path, count, block_size=8192):
+    """Returns the last `count` lines of a file without reading all of it.
+
+    Reads fixed-size blocks backwards from the end until enough newlines
+    have been seen, so the cost depends on `count`, not the file size.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    return data.decode("utf-8", errors="replace").splitlines(keepends=True)[-count:]
+
+def trim_log(retention_days=LOG_RETENTION_DAYS, history=None):
+    """Drops text-log and history segments older than `retention_days`."""
+    TEXT_LOG.expire(retention_days)
+    (history or HistoryStore()).segments.expire(retention_days)
+
+class LogMaintainer:
+    """Expires and compresses log segments on a background thread.
+
+    The check path only calls `request()`, which never touches disk; the
+    actual work runs at most once per day.
+    """
+
+    def __init__(self, history, retention_days=LOG_RETENTION_DAYS, compress=True, tracer=None, rollups=None):
+        self.history = history
+        self.rollups = rollups
+        self.retention_days = retention_days
+        self.compress = compress
+        self.tracer = tracer or CycleTracer(0)
+        self.last_run_day = None
+        self.last_duration = None
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, daemon=True)
+            self.thread.start()
+
+    def request(self):
+        self.wake.set()
+
+    def loop(self):
+        while True:
+            self.wake.wait(3600)
+            self.wake.clear()
+            if self.last_run_day == datetime.date.today():
+                continue
+            self.run()
+
+    def run(self):
+        self.last_run_day = datetime.date.today()
+        trace = self.tracer.begin("maintenance")
+        start = time.perf_counter()
+        with trace.span("trim_log"):
+            trim_log(self.retention_days, self.history)
+        self.last_duration = time.perf_counter() - start
+        if self.compress:
+            with trace.span("compress"):
+                TEXT_LOG.compress_closed()
+                self.history.segments.compress_closed()
+        if self.rollups is not None:
+            with trace.span("rollups"):
+                try:
+                    self.rollups.backfill(self.history)
+                    self.rollups.expire()
+                except sqlite3.Error as e:
+                    print("Rollup maintenance failed:", e)
+        self.tracer.finish(trace)
+
+# --- Scheduling ---
+class CheckScheduler:
+    """Heap of due times deciding which hosts need a probe next.
+
+    A host's servers.json entry may set its own "interval", "jitter" and
+    "retry_interval" in seconds; otherwise the global check interval is
+    used. While a host is down it is rechecked after its retry interval,
+    doubling on every further failure up to its normal interval. A random
+    jitter on every reschedule spreads hosts out instead of probing the
+    whole fleet in one burst.
+    """
+
+    def __init__(self, default_interval, server_options=None, retry_interval=DEFAULT_RETRY_SECONDS):
+        self.default_interval = default_interval
+        self.server_options = server_options if server_options is not None else {}
+        self.retry_interval = retry_interval
+        self.heap = []
+        self.due = {}  # host -> current due time; heap entries that disagree are stale
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def interval_for(self, host):
+        return self.server_options.get(host, {}).get("interval", self.default_interval)
+
+    def _push(self, host, due):
+        self.due[host] = due
+        heapq.heappush(self.heap, (due, host))
+
+    def schedule(self, hosts, start=None, spread=0):
+        """Makes `hosts` due evenly spaced from `start` (default now) over `spread` seconds."""
+        start = time.time() if start is None else start
+        with self.lock:
+            for i, host in enumerate(hosts):
+                self._push(host, start + spread * i / len(hosts))
+
+    def remove(self, hosts):
+        with self.lock:
+            for host in hosts:
+                self.due.pop(host, None)  # its heap entry is skipped as stale
+                self.failures.pop(host, None)
+
+    def set_hosts(self, hosts, first_due=None):
+        """Tracks exactly `hosts`; new ones become due at `first_due` (default now)."""
+        first_due = time.time() if first_due is None else first_due
+        with self.lock:
+            wanted = set(hosts)
+            for host in list(self.due):
+                if host not in wanted:
+                    del self.due[host]
+                    self.failures.pop(host, None)
+            for host in hosts:
+                if host not in self.due:
+                    self._push(host, first_due)
+
+    def set_default_interval(self, seconds):
+        with self.lock:
+            self.default_interval = seconds
+            now = time.time()
+            for host in list(self.due):
+                if "interval" not in self.server_options.get(host, {}):
+                    self._push(host, now + seconds)
+
+    def pop_due(self, now=None):
+        now = time.time() if now is None else now
+        hosts = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due, host = heapq.heappop(self.heap)
+                if self.due.get(host) == due:
+                    del self.due[host]
+                    hosts.append(host)
+        return hosts
+
+    def next_due(self):
+        with self.lock:
+            while self.heap and self.due.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def reschedule(self, host, online, now=None):
+        now = time.time() if now is None else now
+        options = self.server_options.get(host, {})
+        interval = self.interval_for(host)
+        with self.lock:
+            if online:
+                self.failures.pop(host, None)
+                delay = interval
+            else:
+                failures = self.failures.get(host, 0) + 1
+                self.failures[host] = failures
+                retry = options.get("retry_interval", self.retry_interval)
+                delay = min(interval, retry * 2 ** (failures - 1))
+            jitter = options.get("jitter", interval * DEFAULT_JITTER_FRACTION)
+            self._push(host, now + delay + random.uniform(0, jitter))
+
+    def postpone(self, hosts, delay):
+        now = time.time()
+        with self.lock:
+            for host in hosts:
+                self._push(host, now + delay)
+
+# --- Host State ---
+class RingBuffer:
+    """Fixed-capacity ring buffer stored in a typed `array.array`.
+
+    Memory per host stays constant however long the checker runs.
+    """
+
+    def __init__(self, capacity, typecode="b"):
+        self.capacity = max(1, int(capacity))
+        self.data = array.array(typecode, [0]) * self.capacity
+        self.count = 0
+        self.index = 0
+
+    def append(self, value):
+        self.data[self.index] = value
+        self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def values(self):
+        """Returns the stored values, oldest first."""
+        if self.count < self.capacity:
+            return self.data[:self.count].tolist()
+        return (self.data[self.index:] + self.data[:self.index]).tolist()
+
+    def last(self, n):
+        return self.values()[-n:]
+
+    def __len__(self):
+        return self.count
+
+HOST_UNKNOWN = "unknown"
+HOST_UP = "up"
+HOST_DOWN = "down"
+
+LatencyStats = namedtuple("LatencyStats", ["p50", "p95", "p99", "loss_pct"])
+
+class HostState:
+    __slots__ = ("status", "changed_at", "flapping", "slow", "cert_expiring", "window", "rtt")
+
+    def __init__(self, window_size, latency_window=DEFAULT_LATENCY_WINDOW):
+        self.status = HOST_UNKNOWN
+        self.changed_at = time.time()
+        self.flapping = False
+        self.slow = False
+        self.cert_expiring = False
+        self.window = RingBuffer(window_size, "b")
+        self.rtt = RingBuffer(latency_window, "f")
+
+def _percentile(sorted_values, pct):
+    position = (len(sorted_values) - 1) * pct / 100
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+def compute_latency_stats(states):
+    """Rolling p50/p95/p99 RTT and loss % for every HostState in `states`.
+
+    With NumPy the ring buffers are copied into two matrices and all hosts
+    are reduced in one vectorized pass; without it each host is computed
+    in pure Python.
+    """
+    hosts = list(states)
+    if not hosts:
+        return {}
+    stats = {}
+    np = optional_import("numpy")
+    if np is not None:
+        first = states[hosts[0]]
+        rtts = np.full((len(hosts), first.rtt.capacity), np.nan, dtype=np.float32)
+        outcomes = np.full((len(hosts), first.window.capacity), np.nan, dtype=np.float32)
+        for i, host in enumerate(hosts):
+            state = states[host]
+            if len(state.rtt):
+                rtts[i, :len(state.rtt)] = np.frombuffer(state.rtt.data, dtype=np.float32)[:len(state.rtt)]
+            if len(state.window):
+                outcomes[i, :len(state.window)] = np.frombuffer(state.window.data, dtype=np.int8)[:len(state.window)]
+        with warnings.catch_warnings():
+            # Hosts that never answered have all-NaN rows
+            warnings.simplefilter("ignore", RuntimeWarning)
+            percentiles = np.nanpercentile(rtts, [50, 95, 99], axis=1)
+            loss = 100 * (1 - np.nanmean(outcomes, axis=1))
+        for i, host in enumerate(hosts):
+            values = [None if math.isnan(v) else float(v) for v in percentiles[:, i]]
+            stats[host] = LatencyStats(*values, None if math.isnan(loss[i]) else float(loss[i]))
+        return stats
+
+    for host in hosts:
+        state = states[host]
+        rtts = sorted(state.rtt.values())
+        outcomes = state.window.values()
+        if rtts:
+            p50, p95, p99 = (_percentile(rtts, pct) for pct in (50, 95, 99))
+        else:
+            p50 = p95 = p99 = None
+        loss = 100 * (1 - sum(outcomes) / len(outcomes)) if outcomes else None
+        stats[host] = LatencyStats(p50, p95, p99, loss)
+    return stats
+
+class HostTracker:
+    """Per-host state machine turning raw probe results into confirmed changes.
+
+    A host is only confirmed down once `confirm_failures` of its last
+    `confirm_window` probes failed; one successful probe brings it back up.
+    A host whose last `flap_window` probes changed state too often is
+    marked flapping, and its up/down events are held back until it
+    settles. `record` returns the event to alert on, if any: "down", "up",
+    "flapping" or "stable".
+    """
+
+    def __init__(self, confirm_failures=DEFAULT_CONFIRM_FAILURES, confirm_window=DEFAULT_CONFIRM_WINDOW,
+                 flap_window=DEFAULT_FLAP_WINDOW, flap_threshold=DEFAULT_FLAP_THRESHOLD,
+                 latency_window=DEFAULT_LATENCY_WINDOW):
+        self.confirm_window = max(1, confirm_window)
+        self.confirm_failures = min(max(1, confirm_failures), self.confirm_window)
+        self.flap_window = max(self.confirm_window, flap_window)
+        self.flap_threshold = flap_threshold
+        self.latency_window = latency_window
+        self.hosts = {}
+
+    def state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.flap_window, self.latency_window)
+        return state
+
+    def is_up(self, host):
+        state = self.hosts.get(host)
+        return None if state is None or state.status == HOST_UNKNOWN else state.status == HOST_UP
+
+    def forget(self, host):
+        self.hosts.pop(host, None)
+
+    def pending(self, host):
+        """True while the last probe failed but the failure is not yet confirmed."""
+        state = self.hosts.get(host)
+        if state is None or state.status == HOST_DOWN or not len(state.window):
+            return False
+        recent = state.window.last(self.confirm_window)
+        return recent[-1] == 0 and recent.count(0) < self.confirm_failures
+
+    def flap_ratio(self, state):
+        # Judged over the samples available once there are enough to tell a flap
+        # from a single outage, so new hosts (and every host after a restart)
+        # don't get a whole flap_window of unsuppressed alerts first
+        values = state.window.values()
+        if len(values) < max(3, self.confirm_window):
+            return 0.0
+        changes = sum(1 for a, b in zip(values, values[1:]) if a != b)
+        if changes < MIN_FLAP_CHANGES:
+            return 0.0
+        return changes / (len(values) - 1)
+
+    def latency_stats(self, hosts):
+        return compute_latency_stats({h: self.hosts[h] for h in hosts if h in self.hosts})
+
+    def check_latency(self, host, stats, threshold_ms):
+        """Returns "slow" when p95 RTT crosses `threshold_ms` and "latency_ok" when it drops back."""
+        state = self.hosts.get(host)
+        if state is None or not threshold_ms or stats.p95 is None or len(state.rtt) < MIN_LATENCY_SAMPLES:
+            return None
+        if not state.slow and stats.p95 > threshold_ms:
+            state.slow = True
+            return "slow"
+        if state.slow and stats.p95 <= threshold_ms:
+            state.slow = False
+            return "latency_ok"
+        return None
+
+    def check_certificate(self, host, cert_days, warn_days):
+        """Returns "cert_expiring" when the certificate gets within `warn_days` of expiry and "cert_renewed" after."""
+        state = self.hosts.get(host)
+        if state is None or cert_days is None:
+            return None
+        if not state.cert_expiring and cert_days < warn_days:
+            state.cert_expiring = True
+            return "cert_expiring"
+        if state.cert_expiring and cert_days >= warn_days:
+            state.cert_expiring = False
+            return "cert_renewed"
+        return None
+
+    def record(self, host, online, rtt_ms=None):
+        state = self.state(host)
+        state.window.append(1 if online else 0)
+        if online and rtt_ms is not None:
+            state.rtt.append(rtt_ms)
+        previous = state.status
+
+        if online:
+            state.status = HOST_UP
+        elif state.window.last(self.confirm_window).count(0) >= self.confirm_failures:
+            state.status = HOST_DOWN
+        if state.status != previous:
+            state.changed_at = time.time()
+
+        ratio = self.flap_ratio(state)
+        if not state.flapping and ratio >= self.flap_threshold:
+            state.flapping = True
+            return "flapping"
+        if state.flapping:
+            # Leave flapping with some hysteresis so a borderline host doesn't toggle
+            if ratio < self.flap_threshold * 0.75:
+                state.flapping = False
+                return "down" if state.status == HOST_DOWN else "stable"
+            return None
+
+        if previous == HOST_UP and state.status == HOST_DOWN:
+            return "down"
+        if previous == HOST_DOWN and state.status == HOST_UP:
+            return "up"
+        return None
+
+# --- Alerts ---
+class AlertOutbox:
+    """Alerts waiting to be emailed, persisted so an SMTP outage or a restart doesn't lose them."""
+
+    def __init__(self, path=OUTBOX_FILE, max_alerts=MAX_OUTBOX_ALERTS):
+        self.path = path
+        self.max_alerts = max_alerts
+        self.lock = threading.Lock()
+        self.alerts = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.alerts = json.load(f)
+            except Exception as e:
+                print("Failed to load alert outbox:", e)
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.alerts, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def add(self, alerts):
+        with self.lock:
+            self.alerts.extend(alerts)
+            # Keep the newest alerts if the outbox has been stuck for a long time
+            del self.alerts[:-self.max_alerts]
+            self._save()
+
+    def pending(self):
+        with self.lock:
+            return list(self.alerts)
+
+    def remove(self, alert_ids):
+        alert_ids = set(alert_ids)
+        with self.lock:
+            self.alerts = [a for a in self.alerts if a["id"] not in alert_ids]
+            self._save()
+
+    def __len__(self):
+        return len(self.alerts)
+
+def build_alert_message(alerts, sender, recipients):
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    failed = [a for a in alerts if a["kind"] == "down"]
+    flapping = [a for a in alerts if a["kind"] == "flapping"]
+    recovered = [a for a in alerts if a["kind"] == "up"]
+    slow = [a for a in alerts if a["kind"] == "slow"]
+    latency_ok = [a for a in alerts if a["kind"] == "latency_ok"]
+    expiring = [a for a in alerts if a["kind"] == "cert_expiring"]
+    renewed = [a for a in alerts if a["kind"] == "cert_renewed"]
+
+    if failed:
+        subject = "⚠️ Server Offline Alert"
+    elif flapping:
+        subject = "⚠️ Server Flapping Alert"
+    elif slow:
+        subject = "⚠️ Server Latency Alert"
+    elif expiring:
+        subject = "⚠️ Certificate Expiry Warning"
+    elif renewed and not (recovered or latency_ok):
+        subject = "✅ Certificate Renewed"
+    else:
+        subject = "✅ Server Recovery"
+
+    sections = []
+    if failed:
+        sections.append("The following server(s) are OFFLINE:\n\n"
+                        + "".join(f"❌ {a['host']} (since {a['ts']}){' – ' + a['detail'] if a.get('detail') else ''}\n"
+                                  for a in failed))
+    if flapping:
+        sections.append("The following server(s) are FLAPPING between online and offline:\n\n"
+                        + "".join(f"🔀 {a['host']} (since {a['ts']})\n" for a in flapping))
+    if slow:
+        sections.append("The following server(s) are responding SLOWLY:\n\n"
+                        + "".join(f"🐢 {a['host']} (since {a['ts']}) – {a.get('detail', '')}\n" for a in slow))
+    if recovered:
+        sections.append("The following server(s) are back ONLINE:\n\n"
+                        + "".join(f"✅ {a['host']} (at {a['ts']})\n" for a in recovered))
+    if latency_ok:
+        sections.append("The following server(s) are responding normally again:\n\n"
+                        + "".join(f"✅ {a['host']} (at {a['ts']}) – {a.get('detail', '')}\n" for a in latency_ok))
+    if expiring:
+        sections.append("The TLS certificate of the following server(s) expires SOON:\n\n"
+                        + "".join(f"🔒 {a['host']} (at {a['ts']}) – {a.get('detail', '')}\n" for a in expiring))
+    if renewed:
+        sections.append("The TLS certificate of the following server(s) has been renewed:\n\n"
+                        + "".join(f"✅ {a['host']} (at {a['ts']}) – {a.get('detail', '')}\n" for a in renewed))
+
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = ", ".join(recipients)
+    msg["Subject"] = subject
+    msg.attach(MIMEText("\n".join(sections), "plain"))
+    return msg
+
+class AlertDispatcher:
+    """Emails queued alerts from a background thread.
+
+    Alerts raised within `coalesce_seconds` of each other go out as one
+    digest. One authenticated SMTP session is kept open and reused, and is
+    reconnected when the server has dropped it. Failed deliveries stay in
+    the outbox and are retried with exponential backoff, so probing never
+    waits on the mail server.
+
+    `credentials` is called before each delivery and returns
+    (sender, password, recipients), so changes made in the GUI apply at once.
+    """
+
+    def __init__(self, outbox, credentials, smtp_host=DEFAULT_SMTP_HOST, smtp_port=DEFAULT_SMTP_PORT,
+                 starttls=True, login=True, coalesce_seconds=DEFAULT_ALERT_COALESCE_SECONDS, tracer=None):
+        self.outbox = outbox
+        self.credentials = credentials
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.starttls = starttls
+        self.login = login
+        self.coalesce_seconds = coalesce_seconds
+        self.tracer = tracer or CycleTracer(0)
+        self.smtp = None
+        self.smtp_used_at = 0
+        self.failures = 0
+        self.retry_at = 0
+        self.send_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, daemon=True)
+            self.thread.start()
+
+    def enqueue(self, kind, hosts, details=None):
+        details = details or {}
+        timestamp = datetime.datetime.now().strftime(DATE_FORMAT)
+        alerts = []
+        for h in hosts:
+            alert = {"id": uuid.uuid4().hex, "kind": kind, "host": h, "ts": timestamp, "queued_at": time.time()}
+            if details.get(h):
+                alert["detail"] = details[h]
+            alerts.append(alert)
+        if alerts:
+            self.outbox.add(alerts)
+            self.wake.set()
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            alerts = self.outbox.pending()
+            now = time.time()
+            if not alerts:
+                if self.smtp and now - self.smtp_used_at > SMTP_IDLE_SECONDS:
+                    self.close()
+                delay = 60
+            else:
+                # Hold the first alert for the coalesce window so a burst goes out as one digest
+                ready_at = max(min(a["queued_at"] for a in alerts) + self.coalesce_seconds, self.retry_at)
+                delay = ready_at - now
+                if delay <= 0:
+                    self.flush()
+                    continue
+            self.wake.wait(delay)
+            self.wake.clear()
+
+    def flush(self):
+        """Tries to deliver everything in the outbox right now. Returns True if it was emptied."""
+        with self.send_lock:
+            alerts = self.outbox.pending()
+            if not alerts:
+                return True
+            sender, password, recipients = self.credentials()
+            if not recipients:
+                # Nobody to notify; drop the alerts like the checker always has
+                self.outbox.remove(a["id"] for a in alerts)
+                return True
+            if not sender or (self.login and not password):
+                print("No sender credentials set. Alerts kept in the outbox.")
+                self._backoff()
+                return False
+            trace = self.tracer.begin("alerts")
+            try:
+                with trace.span("build_message"):
+                    msg = build_alert_message(alerts, sender, recipients)
+                with trace.span("connect"):
+                    session = self._session(sender, password)
+                with trace.span("send"):
+                    session.sendmail(sender, recipients, msg.as_string())
+                self.smtp_used_at = time.time()
+                self.outbox.remove(a["id"] for a in alerts)
+                self.failures = 0
+                self.retry_at = 0
+                print("Email alert sent.")
+                return True
+            except Exception as e:
+                print("Failed to send email:", e)
+                self.close()
+                self._backoff()
+                return False
+            finally:
+                self.tracer.finish(trace)
+
+    def _backoff(self):
+        self.failures += 1
+        self.retry_at = time.time() + min(900, 15 * 2 ** (self.failures - 1))
+
+    def _session(self, sender, password):
+        import smtplib
 
-def log_separator():
-    log_line("=" * 60)
+        if self.smtp is not None:
+            try:
+                if self.smtp.noop()[0] == 250:
+                    return self.smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
 
-def log_status_block(server_statuses):
-    timestamp = datetime.datetime.now().strftime(DATE_FORMAT)
-    log_line("")
-    log_line(f"🔁 PING CHECK @ {timestamp}")
-    for server, status in server_statuses.items():
-        log_line(f"{server:<25} | {'✅ ONLINE' if status else '❌ OFFLINE'}")
-    log_separator()
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.login and password:
+                server.login(sender, password)
+        except Exception:
+            server.close()
+            raise
+        self.smtp = server
+        return server
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                self.smtp.close()
+            self.smtp = None
 
-def log_server_change(change_type, affected_server, updated_list):
-    timestamp = datetime.datetime.now().strftime(DATE_FORMAT)
-    log_line("")
-    log_line(f"⚙️ SERVER LIST UPDATED @ {timestamp}")
-    action = "+ Added" if change_type == "add" else "- Removed"
-    log_line(f"{action}: {affected_server}")
-    log_line("Updated server list:")
-    for s in updated_list:
-        log_line(f"- {s}")
-    log_separator()
-
-def trim_log():
-    if not os.path.exists(LOG_FILE):
-        return
-    cutoff = datetime.datetime.now() - datetime.timedelta(days=30)
-    with open(LOG_FILE, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        keep = False
-        for line in lines:
-            if line.startswith("🔁 PING CHECK @"):
-                timestamp_str = line.split("@")[1].strip()
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        with self.send_lock:
+            self.close()
+
+# --- Tracing ---
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _NullTrace:
+    """Stands in for a trace while tracing is off, so call sites need no checks."""
+    __slots__ = ()
+
+    def span(self, name):
+        return NULL_SPAN
+
+    def time_probe(self, probe):
+        return probe
+
+NULL_SPAN = _NullSpan()
+NULL_TRACE = _NullTrace()
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.trace.spans.append((self.name, self.start - self.trace.origin, end - self.start, threading.get_ident()))
+        return False
+
+class CycleTrace:
+    """Phase spans and per-host probe timings of one cycle.
+
+    Times are in seconds relative to `origin`. Spans and probes are
+    appended from several threads; list.append is atomic so no lock is needed.
+    """
+    __slots__ = ("kind", "started_at", "origin", "spans", "probes", "profiler")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []   # (name, start, duration, thread id)
+        self.probes = []  # (host, start, duration, thread id)
+        self.profiler = None
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def time_probe(self, probe):
+        def timed(host):
+            start = time.perf_counter()
+            try:
+                return probe(host)
+            finally:
+                self.probes.append((host, start - self.origin, time.perf_counter() - start, threading.get_ident()))
+        return timed
+
+    def duration(self):
+        return max((start + length for _, start, length, _ in self.spans), default=0.0)
+
+    def summary(self, slowest=3):
+        timestamp = datetime.datetime.fromtimestamp(self.started_at).strftime(DATE_FORMAT)
+        phases = ", ".join(f"{name} {length * 1000:.1f} ms" for name, _, length, _ in self.spans)
+        text = f"{timestamp} {self.kind} {self.duration() * 1000:.1f} ms: {phases}"
+        if self.probes:
+            hosts = heapq.nlargest(slowest, self.probes, key=lambda p: p[2])
+            text += " | slowest probes: " + ", ".join(f"{host} {length * 1000:.1f} ms" for host, _, length, _ in hosts)
+        return text
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "duration_ms": _round(self.duration() * 1000),
+            "spans": [{"name": name, "start_ms": _round(start * 1000), "duration_ms": _round(length * 1000)}
+                      for name, start, length, _ in self.spans],
+            "probes": [{"host": host, "start_ms": _round(start * 1000), "duration_ms": _round(length * 1000)}
+                       for host, start, length, _ in self.probes]
+        }
+
+    def chrome_events(self):
+        """Returns the trace as Chrome trace-event "complete" events (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [{"name": name, "cat": self.kind, "ph": "X", "pid": pid, "tid": tid,
+                   "ts": (self.started_at + start) * 1e6, "dur": length * 1e6}
+                  for name, start, length, tid in self.spans]
+        events += [{"name": host, "cat": "probe", "ph": "X", "pid": pid, "tid": tid,
+                    "ts": (self.started_at + start) * 1e6, "dur": length * 1e6}
+                   for host, start, length, tid in self.probes]
+        return events
+
+class CycleTracer:
+    """Keeps the last `capacity` traces of each kind and dumps profiles on request.
+
+    Every kind ("cycle", "render", "connectivity", "maintenance",
+    "alerts") has its own ring, so frequent background traces never push
+    out cycle traces. GUI work that follows a cycle is a "render" trace,
+    begun on the GUI thread once the cycle trace is finished.
+
+    With `capacity` 0 and no profile requested, `begin` hands out
+    NULL_TRACE and nothing is timed or stored. `profile(n, fmt)` makes the
+    next n "cycle" traces, and the "render" trace after each of them, also
+    write `traces/<kind>-<time>.prof` (cProfile, covering the thread that
+    began the trace) or `.json` (Chrome trace events).
+    """
+
+    def __init__(self, capacity=DEFAULT_TRACE_CYCLES, trace_dir=TRACE_DIR):
+        self.capacity = capacity
+        self.traces = {}  # kind -> deque of finished traces
+        self.trace_dir = trace_dir
+        self.profile_remaining = 0
+        self.profile_renders = 0  # profiled cycles whose render trace is still to come
+        self.profile_format = "cprofile"
+
+    def profile(self, cycles, fmt="cprofile"):
+        if fmt not in ("cprofile", "chrome"):
+            raise ValueError(f"Unknown profile format: {fmt}")
+        self.profile_format = fmt
+        self.profile_remaining = cycles
+
+    def begin(self, kind="cycle"):
+        if kind == "cycle":
+            profiling = self.profile_remaining > 0
+        else:
+            profiling = kind == "render" and self.profile_renders > 0
+        if not self.capacity and not profiling:
+            return NULL_TRACE
+        trace = CycleTrace(kind)
+        if profiling:
+            if kind == "cycle":
+                self.profile_remaining -= 1
+                self.profile_renders += 1
+            else:
+                self.profile_renders -= 1
+            if self.profile_format == "cprofile":
+                import cProfile
+
+                trace.profiler = cProfile.Profile()
+                try:
+                    trace.profiler.enable()
+                except ValueError:
+                    trace.profiler = None  # another profiler is already active on this thread
+            else:
+                trace.profiler = False  # marks a Chrome trace dump
+        return trace
+
+    def finish(self, trace):
+        if trace is NULL_TRACE:
+            return
+        if trace.profiler:
+            trace.profiler.disable()
+        if self.capacity:
+            ring = self.traces.get(trace.kind)
+            if ring is None:
+                ring = self.traces[trace.kind] = deque(maxlen=self.capacity)
+            ring.append(trace)
+        if trace.profiler is not None:
+            self.dump(trace)
+
+    def recent(self):
+        return sorted((trace for ring in list(self.traces.values()) for trace in ring), key=lambda trace: trace.started_at)
+
+    def dump(self, trace):
+        os.makedirs(self.trace_dir, exist_ok=True)
+        stamp = datetime.datetime.fromtimestamp(trace.started_at).strftime("%Y%m%d-%H%M%S-%f")
+        try:
+            if trace.profiler:
+                path = os.path.join(self.trace_dir, f"{trace.kind}-{stamp}.prof")
+                trace.profiler.dump_stats(path)
+            else:
+                path = os.path.join(self.trace_dir, f"{trace.kind}-{stamp}.json")
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"traceEvents": trace.chrome_events(), "displayTimeUnit": "ms"}, f)
+            print("Trace written to", path)
+        except OSError as e:
+            print("Failed to write trace:", e)
+        trace.profiler = None
+
+# --- Check Coordination ---
+class CheckCoordinator:
+    """Runs every check cycle on one worker thread.
+
+    The scheduler, "Check Now" and "Apply Changes" all call `request`.
+    Hosts already waiting are merged into the pending request, and hosts
+    that the running cycle is probing are dropped, since that cycle will
+    report them. Cycles never overlap, so `last_status` and the log are
+    only touched by one thread, and repeated clicks can't pile up threads.
+    """
+
+    def __init__(self, run_cycle):
+        self.run_cycle = run_cycle
+        self.pending = {}  # insertion-ordered set of hosts waiting for the next cycle
+        self.in_progress = set()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, daemon=True)
+            self.thread.start()
+
+    def request(self, hosts):
+        with self.condition:
+            for host in hosts:
+                if host not in self.in_progress:
+                    self.pending[host] = None
+            if self.pending:
+                self.condition.notify()
+
+    def queue_depth(self):
+        return len(self.pending)
+
+    def loop(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                batch = list(self.pending)
+                self.pending.clear()
+                self.in_progress = set(batch)
+            try:
+                self.run_cycle(batch)
+            except Exception as e:
+                print("Check cycle failed:", e)
+            finally:
+                with self.condition:
+                    self.in_progress = set()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+# --- Metrics ---
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class CheckerMetrics:
+    """Prometheus text-format metrics for host status and checker internals.
+
+    Per-host lines are rebuilt only for the hosts of each finished cycle
+    and the joined body is cached, so a scrape never touches disk or walks
+    the fleet; it only appends a few live gauges read from counters.
+    Hosts report the Unix time of their last state change; Prometheus
+    gets "time since" as `time() - server_checker_host_state_change_timestamp_seconds`.
+    """
+
+    HOST_HELP = (
+        "# HELP server_checker_host_up 1 if the host answered its last probe.\n"
+        "# TYPE server_checker_host_up gauge\n"
+        "# HELP server_checker_host_rtt_milliseconds Round-trip time of the last successful probe.\n"
+        "# TYPE server_checker_host_rtt_milliseconds gauge\n"
+        "# HELP server_checker_host_state_change_timestamp_seconds Unix time of the last confirmed up/down change.\n"
+        "# TYPE server_checker_host_state_change_timestamp_seconds gauge\n"
+        "# HELP server_checker_host_http_stage_milliseconds Time spent in each stage of the last HTTP(S) check.\n"
+        "# TYPE server_checker_host_http_stage_milliseconds gauge\n"
+        "# HELP server_checker_host_cert_expiry_days Days until the host's TLS certificate expires.\n"
+        "# TYPE server_checker_host_cert_expiry_days gauge\n"
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.host_lines = {}
+        self.host_body = ""
+        self.cycles_total = 0
+        self.probes_total = 0
+        self.last_cycle_seconds = 0.0
+        self.last_cycle_timestamp = 0.0
+
+    def update_cycle(self, probes, tracker, duration):
+        lines = {}
+        for host, probe in probes.items():
+            label = f'{{host="{_label(host)}"}}'
+            state = tracker.hosts.get(host)
+            text = f"server_checker_host_up{label} {1 if probe.online else 0}\n"
+            if probe.rtt_ms is not None:
+                text += f"server_checker_host_rtt_milliseconds{label} {probe.rtt_ms:.3f}\n"
+            if state is not None:
+                text += f"server_checker_host_state_change_timestamp_seconds{label} {state.changed_at:.0f}\n"
+            for stage, ms in (probe.timings or {}).items():
+                text += f'server_checker_host_http_stage_milliseconds{{host="{_label(host)}",stage="{stage}"}} {ms:.3f}\n'
+            if probe.cert_days is not None:
+                text += f"server_checker_host_cert_expiry_days{label} {probe.cert_days}\n"
+            lines[host] = text
+        with self.lock:
+            self.host_lines.update(lines)
+            self.host_body = self.HOST_HELP + "".join(self.host_lines.values())
+            self.cycles_total += 1
+            self.probes_total += len(probes)
+            self.last_cycle_seconds = duration
+            self.last_cycle_timestamp = time.time()
+
+    def forget(self, host):
+        with self.lock:
+            if self.host_lines.pop(host, None) is not None:
+                self.host_body = self.HOST_HELP + "".join(self.host_lines.values())
+
+    def render(self, in_flight=0, queue_depth=0, outbox_size=0, trim_log_seconds=None):
+        with self.lock:
+            body = self.host_body
+            internals = [
+                ("server_checker_cycles_total", "counter", "Check cycles completed.", self.cycles_total),
+                ("server_checker_probes_total", "counter", "Hosts probed by completed cycles.", self.probes_total),
+                ("server_checker_cycle_duration_seconds", "gauge", "Wall time of the last check cycle.", self.last_cycle_seconds),
+                ("server_checker_last_cycle_timestamp_seconds", "gauge", "Unix time the last cycle finished.", self.last_cycle_timestamp)
+            ]
+        internals += [
+            ("server_checker_probes_in_flight", "gauge", "Probes currently running.", in_flight),
+            ("server_checker_check_queue_depth", "gauge", "Hosts waiting for the next check cycle.", queue_depth),
+            ("server_checker_alert_outbox_size", "gauge", "Alerts waiting to be emailed.", outbox_size)
+        ]
+        if trim_log_seconds is not None:
+            internals.append(("server_checker_trim_log_duration_seconds", "gauge", "Wall time of the last log retention run.", trim_log_seconds))
+        text = "".join(f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n{name} {value}\n" for name, kind, help_text, value in internals)
+        return (body + text).encode("utf-8")
+
+class MetricsServer:
+    """Serves read-only endpoints from a daemon thread.
+
+    `routes` maps a path such as "/metrics" to (content type, render),
+    where `render()` returns the response body as bytes.
+    """
+
+    def __init__(self, routes, port, bind=DEFAULT_METRICS_BIND):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                route = routes.get(handler.path.split("?")[0])
+                if route is None:
+                    handler.send_error(404)
+                    return
+                content_type, render = route
+                body = render()
+                handler.send_response(200)
+                handler.send_header("Content-Type", content_type)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass  # keep scrapes out of the console
+
+        self.server = ThreadingHTTPServer((bind, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# --- Monitor Engine ---
+class MonitorEngine:
+    """Scheduling, probing, logging and alerting core.
+
+    Has no GUI dependencies so it can run headless; front ends pass
+    `on_results(probes)` (server -> ProbeResult) and `on_status(text)`
+    callbacks to hear about finished cycles and skipped checks.
+    """
+
+    def __init__(self, on_results=None, on_status=None):
+        self.on_results = on_results
+        self.on_status = on_status
+        self.on_servers_changed = None
+        self.servers = []
+        self.server_options = {}
+        self.monitoring_active = True
+        # False when agents decide when hosts are checked (aggregator mode), so
+        # nothing may be queued on a scheduler whose loop never runs
+        self.schedules_checks = True
+        self.inventory_lock = threading.Lock()
+        self.email_list = []
+        self.last_status = {}
+        self.check_interval = DEFAULT_INTERVAL_SECONDS
+        self.time_remaining = self.check_interval
+        self.sender_email = ""
+        # The password is never written to settings.json; headless runs read it from the environment
+        self.sender_password = os.environ.get(SMTP_PASSWORD_ENV, "")
+        self.probe_timeout = DEFAULT_PROBE_TIMEOUT_SECONDS
+        self.max_in_flight = DEFAULT_MAX_IN_FLIGHT
+        self.text_log = True
+        self.settings = {}
+        self.history = HistoryStore()
+        self.stop_event = threading.Event()
+        self.load_settings()
+        self.inventory_file = self.settings.get("inventory_file", SERVERS_FILE)
+        try:
+            self.servers, self.server_options = split_entries(load_inventory(self.inventory_file))
+        except (OSError, ValueError, KeyError, csv.Error) as e:
+            print(f"Failed to load {self.inventory_file}:", e)
+        self.inventory_watcher = InventoryWatcher(
+            self.inventory_file,
+            self.apply_inventory,
+            self.settings.get("inventory_poll_seconds", DEFAULT_INVENTORY_POLL_SECONDS)
+        )
+        self.resolver = DnsCache(
+            self.settings.get("dns_ttl_seconds", DEFAULT_DNS_TTL_SECONDS),
+            self.settings.get("dns_negative_ttl_seconds", DEFAULT_DNS_NEGATIVE_TTL_SECONDS),
+            self.settings.get("dns_max_stale_seconds", DEFAULT_DNS_MAX_STALE_SECONDS)
+        )
+        self.probe_engine = ProbeEngine(
+            self.probe_timeout, self.max_in_flight, self.server_options, self.resolver,
+            self.settings.get("http_idle_seconds", DEFAULT_HTTP_IDLE_SECONDS)
+        )
+        self.scheduler = CheckScheduler(
+            self.check_interval,
+            self.server_options,
+            self.settings.get("retry_interval_seconds", DEFAULT_RETRY_SECONDS)
+        )
+        self.scheduler.set_hosts(self.servers)
+        self.tracker = HostTracker(
+            self.settings.get("confirm_failures", DEFAULT_CONFIRM_FAILURES),
+            self.settings.get("confirm_window", DEFAULT_CONFIRM_WINDOW),
+            self.settings.get("flap_window", DEFAULT_FLAP_WINDOW),
+            self.settings.get("flap_threshold", DEFAULT_FLAP_THRESHOLD),
+            self.settings.get("latency_window", DEFAULT_LATENCY_WINDOW)
+        )
+        self.latency_threshold = self.settings.get("latency_threshold_ms")
+        self.cert_warn_days = self.settings.get("cert_warn_days", DEFAULT_CERT_WARN_DAYS)
+        self.latency_stats = {}
+        self.confirm_delay = self.settings.get("confirm_delay_seconds", DEFAULT_CONFIRM_DELAY_SECONDS)
+        self.tracer = CycleTracer(self.settings.get("trace_cycles", DEFAULT_TRACE_CYCLES))
+        self.deferred = {}  # hosts skipped while offline, checked as soon as the network is back
+        self.deferred_lock = threading.Lock()
+        self.connectivity = ConnectivityWatcher(
+            self.settings.get("connectivity_sentinels"),
+            self.settings.get("connectivity_ttl_seconds", DEFAULT_CONNECTIVITY_TTL_SECONDS),
+            self.settings.get("connectivity_timeout_seconds", DEFAULT_CONNECTIVITY_TIMEOUT_SECONDS),
+            self.on_connectivity_change,
+            self.probe_known_servers,
+            self.tracer
+        )
+        self.alerts = AlertDispatcher(
+            AlertOutbox(),
+            lambda: (self.sender_email, self.sender_password, self.email_list),
+            self.settings.get("smtp_host", DEFAULT_SMTP_HOST),
+            self.settings.get("smtp_port", DEFAULT_SMTP_PORT),
+            self.settings.get("smtp_starttls", True),
+            self.settings.get("smtp_login", True),
+            self.settings.get("alert_coalesce_seconds", DEFAULT_ALERT_COALESCE_SECONDS),
+            self.tracer
+        )
+        self.coordinator = CheckCoordinator(self.run_cycle)
+        self.metrics = CheckerMetrics()
+        self.metrics_server = None
+        self.rollups = RollupStore(
+            ROLLUP_FILE,
+            self.settings.get("rollup_hourly_days", DEFAULT_ROLLUP_HOURLY_DAYS),
+            self.settings.get("rollup_daily_days", DEFAULT_ROLLUP_DAILY_DAYS)
+        )
+        self.sla_target = self.settings.get("sla_target_pct", DEFAULT_SLA_TARGET_PCT)
+        self.log_maintainer = LogMaintainer(
+            self.history,
+            self.settings.get("log_retention_days", LOG_RETENTION_DAYS),
+            self.settings.get("compress_logs", True),
+            self.tracer,
+            self.rollups
+        )
+
+    def load_settings(self):
+        if not os.path.exists(SETTINGS_FILE):
+            return
+        try:
+            with open(SETTINGS_FILE, "r") as f:
+                data = json.load(f)
+            self.settings = data
+            self.email_list = data.get("email_list", [])
+            self.sender_email = data.get("sender_email", "")
+            interval = data.get("interval_minutes", 60)
+            self.check_interval = interval * 60
+            self.time_remaining = self.check_interval
+            self.probe_timeout = data.get("probe_timeout_seconds", DEFAULT_PROBE_TIMEOUT_SECONDS)
+            self.max_in_flight = data.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT)
+            self.text_log = data.get("text_log", True)
+        except Exception as e:
+            print("Failed to load settings:", e)
+
+    def save_settings(self, **extra):
+        """Writes the engine's settings, keeping keys owned by front ends."""
+        data = dict(self.settings)
+        data.update({
+            "email_list": self.email_list,
+            "sender_email": self.sender_email,
+            "interval_minutes": self.check_interval // 60,
+            "probe_timeout_seconds": self.probe_timeout,
+            "max_in_flight": self.max_in_flight,
+            "text_log": self.text_log
+        })
+        data.update(extra)
+        self.settings = data
+        try:
+            with open(SETTINGS_FILE, "w") as f:
+                json.dump(data, f)
+        except Exception as e:
+            print("Failed to save settings:", e)
+
+    def record(self, record):
+        """Appends a record to the history and, if enabled, to the text log."""
+        try:
+            self.history.append(record)
+            if self.text_log:
+                log_lines(render_history_record(record))
+        except OSError as e:
+            print("Failed to write history:", e)
+
+    def set_interval(self, minutes):
+        self.check_interval = minutes * 60
+        self.time_remaining = self.check_interval
+        self.scheduler.set_default_interval(self.check_interval)
+        self.save_settings()
+
+    def apply_servers(self, server_list):
+        """Applies a server list edited in the GUI; kept servers keep their options."""
+        self.apply_inventory(server_entries(server_list, self.server_options), save=True)
+
+    def apply_inventory(self, entries, save=False):
+        """Brings the monitored servers in line with `entries`, touching only what changed.
+
+        Unchanged servers keep their state and schedule. Removed ones are
+        forgotten. New servers, and servers whose probe settings changed,
+        get their first check spread over len(new) / import_probe_rate
+        seconds, so a bulk import doesn't fire thousands of probes at once.
+        The change is logged as one diff record.
+        """
+        # Held against process_results so a host removed mid-cycle can't come back
+        with self.inventory_lock:
+            servers, options = split_entries(entries)
+            current = set(self.servers)
+            wanted = set(servers)
+            added = [s for s in servers if s not in current]
+            removed = [s for s in self.servers if s not in wanted]
+            changed = [s for s in servers if s in current and options.get(s, {}) != self.server_options.get(s, {})]
+            if not (added or removed or changed) and servers == self.servers:
+                return
+            reprobe = added + [s for s in changed if probe_settings(options.get(s)) != probe_settings(self.server_options.get(s))]
+
+            if added or removed or changed:
+                self.record(server_diff_record(added, removed, changed, len(servers)))
+            for s in removed:
+                self.forget_host(s)
+            # Updated in place: the dict is shared with the probe engine and scheduler
+            for s in list(self.server_options):
+                if s not in options:
+                    del self.server_options[s]
+            self.server_options.update(options)
+            self.servers = servers
+            self.scheduler.remove(removed)
+            if reprobe and self.schedules_checks:
+                rate = self.settings.get("import_probe_rate", DEFAULT_IMPORT_PROBE_RATE)
+                spread = min(self.check_interval, max(0, len(reprobe) - self.max_in_flight) / rate)
+                self.scheduler.schedule(reprobe, spread=spread)
+
+            if save:
+                try:
+                    save_inventory(self.inventory_file, self.servers, self.server_options)
+                    self.inventory_watcher.mark_current()
+                except OSError as e:
+                    print(f"Failed to save {self.inventory_file}:", e)
+        if self.on_servers_changed:
+            self.on_servers_changed()
+
+    def forget_host(self, host):
+        """Drops all state kept for a host that is no longer monitored."""
+        self.tracker.forget(host)
+        self.latency_stats.pop(host, None)
+        self.metrics.forget(host)
+        self.resolver.forget(host)
+        self.probe_engine.http_pool.forget(host)
+        self.last_status.pop(host, None)
+        with self.deferred_lock:
+            self.deferred.pop(host, None)
+
+    def check_now(self):
+        self.run_ping(self.servers)
+
+    def run_cycle(self, server_list):
+        """Probes `server_list` once, logs the block and sends alerts. Blocking."""
+        trace = self.tracer.begin()
+        cycle_start = time.perf_counter()
+        samples, events = self.probe_cycle(server_list, trace)
+        results = self.process_results(samples, events, trace, cycle_start)
+        self.tracer.finish(trace)
+        return results
+
+    def probe_cycle(self, server_list, trace=NULL_TRACE):
+        """Probes `server_list`, re-probing fresh failures until the tracker confirms them.
+
+        Returns (samples, events): every ProbeResult taken per host, oldest
+        first, and the tracker events they raised.
+        """
+        with trace.span("probe"):
+            probes = self.probe_engine.run(server_list, trace)
+        samples = {s: [probe] for s, probe in probes.items()}
+        events = {}
+        for s, probe in probes.items():
+            event = self.tracker.record(s, probe.online, probe.rtt_ms)
+            if event:
+                events[s] = event
+
+        # Confirm fresh failures with quick back-to-back probes before calling a host down
+        with trace.span("confirm"):
+            pending = [s for s in probes if self.tracker.pending(s)]
+            while pending and not self.stop_event.is_set():
+                self.stop_event.wait(self.confirm_delay)
+                confirmations = self.probe_engine.run(pending, trace)
+                for s, probe in confirmations.items():
+                    samples[s].append(probe)
+                    event = self.tracker.record(s, probe.online, probe.rtt_ms)
+                    if event:
+                        events[s] = event
+                pending = [s for s in pending if self.tracker.pending(s)]
+        return samples, events
+
+    def replay_samples(self, samples):
+        """Feeds samples probed elsewhere (by an agent) through the tracker; returns the events."""
+        events = {}
+        for s, host_samples in samples.items():
+            for probe in host_samples:
+                event = self.tracker.record(s, probe.online, probe.rtt_ms)
+                if event:
+                    events[s] = event
+        return events
+
+    def update_status(self, probes):
+        """Stores the confirmed status of each probed host and schedules its next check."""
+        if any(probe.online for probe in probes.values()):
+            self.connectivity.report_reachable()
+        results = {s: probe.online for s, probe in probes.items()}
+        current = set(self.servers)
+        for s in results:
+            self.last_status[s] = self.tracker.is_up(s)  # update last known (confirmed) status
+            if s in current and self.schedules_checks:
+                self.scheduler.reschedule(s, self.last_status[s])
+        return results
+
+    def process_results(self, samples, events, trace=NULL_TRACE, cycle_start=None):
+        """Turns one cycle's samples into status, history, metrics, results and alerts.
+
+        Hosts removed from the inventory while they were being probed are
+        dropped here, together with the state their probes recreated.
+        """
+        with self.inventory_lock:
+            samples = self.drop_removed(samples)
+            events = {s: e for s, e in events.items() if s in samples}
+            return self._process_results(samples, events, trace, cycle_start)
+
+    def drop_removed(self, samples):
+        """Returns `samples` without hosts no longer monitored, forgetting what their probes recreated.
+
+        Call with `inventory_lock` held.
+        """
+        current = set(self.servers)
+        for s in samples:
+            if s not in current:
+                self.forget_host(s)
+        return {s: v for s, v in samples.items() if s in current}
+
+    def _process_results(self, samples, events, trace=NULL_TRACE, cycle_start=None):
+        cycle_start = time.perf_counter() if cycle_start is None else cycle_start
+        probes = {s: host_samples[-1] for s, host_samples in samples.items()}
+        with trace.span("reschedule"):
+            results = self.update_status(probes)
+
+        with trace.span("latency"):
+            stats = self.tracker.latency_stats(probes)
+            self.latency_stats.update(stats)
+            latency_events = {}
+            for s, host_stats in stats.items():
+                threshold = self.server_options.get(s, {}).get("latency_threshold_ms", self.latency_threshold)
+                event = self.tracker.check_latency(s, host_stats, threshold)
+                if event:
+                    latency_events[s] = event
+            cert_events = {}
+            for s, probe in probes.items():
+                warn_days = self.server_options.get(s, {}).get("cert_warn_days", self.cert_warn_days)
+                event = self.tracker.check_certificate(s, probe.cert_days, warn_days)
+                if event:
+                    cert_events[s] = event
+
+        with trace.span("history"):
+            record = check_record(probes, {**cert_events, **latency_events, **events}, stats)
+            self.record(record)
+            self.log_maintainer.request()
+        with trace.span("rollups"):
+            self.rollups.add_record(record)
+        with trace.span("metrics"):
+            self.metrics.update_cycle(probes, self.tracker, time.perf_counter() - cycle_start)
+        if self.on_results:
+            with trace.span("on_results"):
+                self.on_results(probes)
+
+        # Smart alert logic: only alert on confirmed changes, never while a host is flapping
+        if self.email_list:
+            with trace.span("enqueue_alerts"):
+                details = {s: "DNS lookup failed" for s, probe in probes.items() if probe.error == PROBE_ERROR_DNS}
+                details.update({s: probe.detail for s, probe in probes.items() if probe.detail})
+                for kind in ("down", "flapping", "up"):
+                    self.alerts.enqueue(kind, [s for s, e in events.items() if e == kind], details)
+                latency_details = {s: f"p95 {stats[s].p95:.1f} ms" for s in latency_events}
+                for kind in ("slow", "latency_ok"):
+                    self.alerts.enqueue(kind, [s for s, e in latency_events.items() if e == kind], latency_details)
+                cert_details = {s: f"certificate expires in {probes[s].cert_days:.0f} days" for s in cert_events}
+                for kind in ("cert_expiring", "cert_renewed"):
+                    self.alerts.enqueue(kind, [s for s, e in cert_events.items() if e == kind], cert_details)
+        return results
+
+    def run_ping(self, server_list):
+        self.coordinator.request(server_list)
+
+    def toggle_monitoring(self):
+        self.monitoring_active = not self.monitoring_active
+        return self.monitoring_active
+
+    def is_internet_connected(self):
+        return self.connectivity.connected
+
+    def probe_known_servers(self, count=3):
+        """Connectivity fallback: True if any probe answered lately or a few random servers still answer.
+
+        The sample is drawn afresh on every call, so a handful of hosts that
+        went down together can't keep the engine offline for good.
+        """
+        if time.time() - self.probe_engine.answered_at < self.connectivity.ttl:
+            return True
+        servers = list(self.servers)
+        candidates = [s for s in servers if self.last_status.get(s)] or servers
+        sample = random.sample(candidates, min(count, len(candidates)))
+        if len(candidates) < len(servers):
+            # One host outside the last-seen-up set, in case those are the ones that went down
+            sample.append(random.choice([s for s in servers if not self.last_status.get(s)]))
+        return any(probe.online for probe in self.probe_engine.run(sample).values())
+
+    def on_connectivity_change(self, connected, since):
+        """Logs an offline period as one record and checks the deferred hosts once the network is back."""
+        if not connected:
+            if self.on_status:
+                self.on_status("🌐 No internet – checks paused")
+            return
+        with self.deferred_lock:
+            deferred, self.deferred = list(self.deferred), {}
+        self.record(offline_record(since, time.time(), len(deferred)))
+        if self.on_status:
+            self.on_status("🌐 Connection restored")
+        if deferred:
+            self.coordinator.request([s for s in deferred if s in self.servers])
+
+    def start(self):
+        self.start_services()
+        t = threading.Thread(target=self.schedule_loop, daemon=True)
+        t.start()
+        return t
+
+    def start_services(self):
+        """Starts everything except the scheduling loop; an aggregator runs only these."""
+        self.log_maintainer.start()
+        self.log_maintainer.request()
+        self.alerts.start()
+        self.resolver.start()
+        self.coordinator.start()
+        if self.schedules_checks:
+            # It only gates this engine's own checks; an aggregator's fallback would probe from the wrong place
+            self.connectivity.start()
+        self.inventory_watcher.start()
+        self.start_metrics_server()
+
+    def schedule_loop(self):
+        while not self.stop_event.is_set():
+            if not self.monitoring_active:
+                self.stop_event.wait(1)
+                continue
+            due = self.scheduler.pop_due()
+            if due:
+                if self.connectivity.connected:
+                    self.coordinator.request(due)
+                else:
+                    with self.deferred_lock:
+                        self.deferred.update(dict.fromkeys(due))
+                    self.scheduler.postpone(due, min(self.check_interval, self.scheduler.retry_interval))
+            next_due = self.scheduler.next_due()
+            self.time_remaining = max(0, int(next_due - time.time())) if next_due else self.check_interval
+            self.stop_event.wait(1)
+
+    def render_metrics(self):
+        return self.metrics.render(
+            self.probe_engine.in_flight,
+            self.coordinator.queue_depth(),
+            len(self.alerts.outbox),
+            self.log_maintainer.last_duration
+        )
+
+    def render_traces(self):
+        return json.dumps([trace.to_dict() for trace in self.tracer.recent()]).encode("utf-8")
+
+    def start_metrics_server(self):
+        port = self.settings.get("metrics_port")
+        if not port or self.metrics_server is not None:
+            return
+        try:
+            routes = {
+                "/metrics": ("text/plain; version=0.0.4; charset=utf-8", self.render_metrics),
+                "/traces": ("application/json", self.render_traces)
+            }
+            self.metrics_server = MetricsServer(routes, port, self.settings.get("metrics_bind", DEFAULT_METRICS_BIND))
+            self.metrics_server.start()
+        except OSError as e:
+            self.metrics_server = None
+            print("Failed to start metrics endpoint:", e)
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self.stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        self.coordinator.stop()
+        self.connectivity.stop()
+        self.inventory_watcher.stop()
+        if not self.connectivity.connected:
+            # Close the open offline period so it isn't lost on exit
+            self.record(offline_record(self.connectivity.since, time.time(), len(self.deferred)))
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.alerts.stop()
+        self.resolver.stop()
+        self.probe_engine.shutdown()
+        self.rollups.close()
+
+# --- Agents ---
+class HashRing:
+    """Consistent-hash ring assigning hosts to agents.
+
+    Each agent sits at `replicas` points on the ring and owns the hosts
+    hashed between its points and the previous ones, so an agent joining
+    or leaving only moves its own share of the inventory.
+    """
+
+    def __init__(self, nodes=(), replicas=DEFAULT_RING_REPLICAS):
+        self.replicas = replicas
+        self.points = []  # sorted point hashes
+        self.owners = {}  # point hash -> node
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+            self.owners[point] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            if self.owners.get(point) == node:
+                del self.owners[point]
+                self.points.pop(bisect.bisect_left(self.points, point))
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        i = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        return self.owners[self.points[i]]
+
+    def shards(self, keys):
+        shards = {}
+        for key in keys:
+            shards.setdefault(self.owner(key), []).append(key)
+        return shards
+
+# Agents and the aggregator talk newline-delimited JSON over TCP:
+#   agent -> aggregator  {"type": "hello", "agent": name, "token": aggregator_token?}
+#                        {"type": "results", "samples": {host: [[online, rtt_ms, error?], ...]}}
+#   aggregator -> agent  {"type": "assign", "servers": [servers.json entries]}
+def send_message(wfile, message):
+    wfile.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+    wfile.flush()
+
+def encode_sample(probe):
+    timings = {stage: _round(ms) for stage, ms in probe.timings.items()} if probe.timings else None
+    values = [int(probe.online), _round(probe.rtt_ms), probe.error, probe.detail, timings, probe.cert_days]
+    while len(values) > 2 and values[-1] is None:
+        values.pop()  # plain up/down samples stay [online, rtt_ms] on the wire
+    return values
+
+def encode_samples(samples):
+    return {s: [encode_sample(p) for p in host_samples] for s, host_samples in samples.items()}
+
+def decode_samples(data):
+    # Earlier agents sent a down sample as just [0], without its rtt
+    return {
+        s: [ProbeResult(bool(v[0]), *(v[1:6] or [None])) for v in host_samples]
+        for s, host_samples in data.items()
+    }
+
+class Aggregator:
+    """Shards the inventory across connected agents and processes what they report.
+
+    Owns `last_status`, history and alerts through `engine`, which runs its
+    services but not its own scheduling loop. The shards are recomputed and
+    pushed to every agent whenever an agent joins or leaves. Batches are
+    processed one at a time, like cycles in a standalone checker. With a
+    `token`, agents whose hello doesn't carry the same token are dropped.
+    """
+
+    def __init__(self, engine, port=DEFAULT_AGGREGATOR_PORT, bind=DEFAULT_AGGREGATOR_BIND, token=None):
+        self.engine = engine
+        self.token = token
+        self.engine.on_servers_changed = self.rebalance
+        self.engine.schedules_checks = False
+        self.agents = {}  # name -> (wfile, send lock)
+        self.lock = threading.Lock()
+        self.process_lock = threading.Lock()
+        aggregator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(handler):
+                name = None
+                try:
+                    for line in handler.rfile:
+                        message = json.loads(line)
+                        if message.get("type") == "hello":
+                            if not aggregator.authorized(message.get("token")):
+                                print(f"Agent {handler.client_address} rejected: wrong token")
+                                return
+                            name = str(message["agent"])
+                            aggregator.join(name, handler.wfile)
+                        elif message.get("type") == "results" and name:
+                            aggregator.ingest(decode_samples(message["samples"]))
+                except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+                    print(f"Agent {name or handler.client_address} dropped:", e)
+                finally:
+                    if name:
+                        aggregator.leave(name, handler.wfile)
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.server = Server((bind, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def authorized(self, token):
+        if not self.token:
+            return True
+        return hmac.compare_digest(str(token or "").encode("utf-8"), str(self.token).encode("utf-8"))
+
+    def join(self, name, wfile):
+        with self.lock:
+            self.agents[name] = (wfile, threading.Lock())
+        self.status(f"🛰️ Agent {name} joined")
+        self.rebalance()
+
+    def leave(self, name, wfile):
+        with self.lock:
+            if self.agents.get(name, (None,))[0] is not wfile:
+                return  # already replaced by a reconnect under the same name
+            del self.agents[name]
+        self.status(f"🛰️ Agent {name} left")
+        self.rebalance()
+
+    def status(self, text):
+        text += f" – {len(self.agents)} agents connected"
+        (self.engine.on_status or print)(text)
+
+    def rebalance(self):
+        """Sends every agent its share of the current server list."""
+        with self.lock:
+            agents = dict(self.agents)
+        shards = HashRing(agents).shards(self.engine.servers)
+        for name, (wfile, send_lock) in agents.items():
+            entries = server_entries(shards.get(name, []), self.engine.server_options)
+            try:
+                with send_lock:
+                    send_message(wfile, {"type": "assign", "servers": entries})
+            except OSError:
+                pass  # its handler notices the closed connection and calls leave()
+
+    def ingest(self, samples):
+        # Agents may report hosts reassigned since they probed them; keep only current ones
+        current = set(self.engine.servers)
+        samples = {s: v for s, v in samples.items() if s in current}
+        if not samples:
+            return
+        with self.process_lock:
+            trace = self.engine.tracer.begin()
+            events = self.engine.replay_samples(samples)
+            self.engine.process_results(samples, events, trace)
+            self.engine.tracer.finish(trace)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class AgentEngine(MonitorEngine):
+    """Checks the shard an aggregator assigns and streams the samples back.
+
+    Scheduling, probing, failure confirmation and DNS caching work as in a
+    standalone checker; the raw samples go to the aggregator, which owns
+    status, history and alerts. Reconnects with backoff, and drops its
+    shard while disconnected since the aggregator hands it to other agents.
+    """
+
+    def __init__(self, address, name=None, on_status=None):
+        super().__init__(on_status=on_status)
+        self.address = address
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.sock = None
+        self.wfile = None
+        self.send_lock = threading.Lock()
+        self.assign([])
+
+    def record(self, record):
+        pass  # history belongs to the aggregator
+
+    def assign(self, entries):
+        count = len(self.servers)
+        self.apply_inventory(entries)
+        if len(self.servers) != count and self.on_status:
+            self.on_status(f"🛰️ {self.name}: assigned {len(self.servers)} servers")
+
+    def start_services(self):
+        self.resolver.start()
+        self.coordinator.start()
+        self.connectivity.start()
+        threading.Thread(target=self.connection_loop, daemon=True).start()
+
+    def connection_loop(self):
+        delay = 1
+        while not self.stop_event.is_set():
+            try:
+                with socket.create_connection(self.address, timeout=10) as sock:
+                    sock.settimeout(None)
+                    rfile, wfile = sock.makefile("rb"), sock.makefile("wb")
+                    with self.send_lock:
+                        self.sock, self.wfile = sock, wfile
+                        hello = {"type": "hello", "agent": self.name}
+                        if self.settings.get("aggregator_token"):
+                            hello["token"] = self.settings["aggregator_token"]
+                        send_message(wfile, hello)
+                    delay = 1
+                    for line in rfile:
+                        message = json.loads(line)
+                        if message.get("type") == "assign":
+                            self.assign(message["servers"])
+            except (OSError, ValueError) as e:
+                if not self.stop_event.is_set():
+                    print("Aggregator connection lost:", e)
+            with self.send_lock:
+                self.sock = self.wfile = None
+            self.assign([])
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, 30)
+
+    def run_cycle(self, server_list):
+        trace = self.tracer.begin()
+        samples, _ = self.probe_cycle(server_list, trace)
+        with self.inventory_lock:
+            samples = self.drop_removed(samples)
+            results = self.update_status({s: host_samples[-1] for s, host_samples in samples.items()})
+        with trace.span("send"):
+            with self.send_lock:
                 try:
-                    timestamp = datetime.datetime.strptime(timestamp_str, DATE_FORMAT)
-                    keep = timestamp >= cutoff
-                except:
-                    keep = False
-            if keep or line.startswith("⚙️ SERVER LIST UPDATED @") or line.startswith("="):
-                f.write(line)
+                    if self.wfile is not None:
+                        send_message(self.wfile, {"type": "results", "samples": encode_samples(samples)})
+                except OSError as e:
+                    print("Failed to send results:", e)
+        self.tracer.finish(trace)
+        return results
+
+    def stop(self):
+        super().stop()
+        with self.send_lock:
+            if self.sock is not None:
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
 
 # --- GUI App ---
 class ServerMonitorApp:
@@ -112,98 +3062,167 @@ class ServerMonitorApp:
         self.root.title("Server Availability Monitor")
         self.root.protocol("WM_DELETE_WINDOW", self.minimize_to_tray)
         self.tray_icon = None
+        self.tray_image = None
         self.tray_thread = None
-        self.servers = load_servers()
-        self.buffered_servers = self.servers.copy()
+        # Engine callbacks arrive on worker threads; widgets are only touched from the Tk thread
+        self.ui_queue = queue.Queue()
+        self.engine = MonitorEngine(
+            on_results=lambda results: self.post(self.render_traced_results, results),
+            on_status=lambda text: self.post(self.show_status, text)
+        )
+        self.engine.on_servers_changed = lambda: self.post(self.reload_server_list)
+        self.buffered_servers = self.engine.servers.copy()
+        self.synced_servers = self.engine.servers.copy()  # what buffered_servers was last in line with
         self.status_labels = {}
-        self.monitoring_active = True
-        self.startup_enabled = False
-        self.email_list = []
-        self.last_status = {}
-        self.check_interval = DEFAULT_INTERVAL_SECONDS
-        self.time_remaining = self.check_interval
         self.countdown_label = None
-        self.sender_email = ""
-        self.sender_password = ""
-        self.load_settings_from_file()
+        self.log_view_path = None
+        self.log_view_offset = 0
+        self.result_rows = {}
+        self.result_state = {}
+        self.status_counts = {}
+        self.hidden_rows = set()
+        self.result_sort = None
         self.build_gui()
-        self.start_hourly_loop()
-        self.start_tray_icon()
+        self.load_settings_from_file()
+        self.drain_ui_queue()
+        self.engine.start()
         if self.start_minimized_var.get():
-            self.root.withdraw()
+            self.root.withdraw()  # start_tray_icon iconifies instead if there is no tray
+        self.start_tray_icon()
+
+    def post(self, callback, *args):
+        """Queues `callback(*args)` to run on the Tk thread. Safe to call from any thread."""
+        self.ui_queue.put((callback, args))
+
+    def drain_ui_queue(self):
+        while True:
+            try:
+                callback, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print("UI update failed:", e)
+        self.root.after(100, self.drain_ui_queue)
 
     def start_tray_icon(self):
+        """Runs the tray icon on its own thread, which also imports pystray/Pillow so the window isn't held up."""
         def quit_app(icon, item):
             icon.stop()
-            self.root.quit()
+            self.post(self.root.quit)
 
         def show_window(icon, item):
-            self.root.after(0, self.root.deiconify)
+            self.post(self.root.deiconify)
 
-        image = self.create_tray_icon_image()
-        menu = pystray.Menu(
-            pystray.MenuItem("Show", show_window),
-            pystray.MenuItem("Exit", quit_app)
-        )
-
-        self.tray_icon = pystray.Icon("ServerMonitor", image, "Server Monitor", menu)
+        start_minimized = self.start_minimized_var.get()
 
         def run_icon():
+            pystray = optional_import("pystray")
+            image = self.create_tray_icon_image()
+            if pystray is None or image is None:
+                print("pystray/Pillow not installed. Running without a tray icon.")
+                if start_minimized:
+                    self.post(self.root.iconify)
+                return
+            menu = pystray.Menu(
+                pystray.MenuItem("Show", show_window),
+                pystray.MenuItem("Exit", quit_app)
+            )
+            self.tray_icon = pystray.Icon("ServerMonitor", image, "Server Monitor", menu)
             self.tray_icon.run()
 
-        threading.Thread(target=run_icon, daemon=True).start()
+        self.tray_thread = threading.Thread(target=run_icon, daemon=True)
+        self.tray_thread.start()
 
     def on_window_close(self):
         self.minimize_to_tray()
         messagebox.showinfo("Running in Background", "Server Monitor is still running in the system tray. Right-click the tray icon to Exit.")
 
-    def is_internet_connected(self):
-        try:
-            socket.create_connection(("8.8.8.8", 53), timeout=3)
-            return True
-        except OSError:
-            return False
-
     def create_tray_icon_image(self):
+        """Loads the tray image once and reuses it; returns None without Pillow."""
+        if self.tray_image is not None:
+            return self.tray_image
+        Image = optional_import("PIL.Image")
+        ImageDraw = optional_import("PIL.ImageDraw")
+        if Image is None or ImageDraw is None:
+            return None
         try:
-            return Image.open("icon.ico")
+            image = Image.open("icon.ico")
+            image.load()
         except Exception as e:
             print("Failed to load tray icon. Using default square icon.")
             image = Image.new("RGB", (64, 64), "white")
             draw = ImageDraw.Draw(image)
             draw.rectangle((16, 16, 48, 48), fill="black")
-            return image
+        self.tray_image = image
+        return image
 
     def show_tray_icon(self):
+        pystray = optional_import("pystray")
+        image = self.create_tray_icon_image()
+        if pystray is None or image is None:
+            self.root.iconify()
+            return
+
         def quit_app(icon, item):
             icon.stop()
-            self.root.destroy()
+            self.post(self.root.destroy)
 
         def show_window(icon, item):
             icon.stop()
-            self.root.after(0, self.root.deiconify)
+            self.post(self.root.deiconify)
 
         menu = pystray.Menu(
             pystray.MenuItem("Show", show_window),
             pystray.MenuItem("Exit", quit_app)
         )
 
-        icon = pystray.Icon("ServerMonitor", self.create_tray_icon_image(), "Server Monitor", menu)
+        icon = pystray.Icon("ServerMonitor", image, "Server Monitor", menu)
         self.tray_icon = icon
         icon.run()
 
     def minimize_to_tray(self):
+        if self.tray_icon is None:
+            self.root.iconify()
+            return
         self.root.withdraw()
         messagebox.showinfo("Running in Background", "Server Monitor is still running in the system tray. Right-click the tray icon to Show or Exit.")
 
+    def log_viewer_tail(self, path):
+        """The last LOG_VIEWER_LINES lines of the log, reaching back into the previous segment after midnight."""
+        lines = tail_lines(path, LOG_VIEWER_LINES) if os.path.exists(path) else []
+        earlier = [p for day, p in TEXT_LOG.segments() if day < datetime.date.today()]
+        if len(lines) < LOG_VIEWER_LINES and earlier:
+            wanted = LOG_VIEWER_LINES - len(lines)
+            if earlier[-1].endswith(".gz"):
+                with TEXT_LOG.open_segment(earlier[-1]) as f:
+                    lines = list(deque(f, maxlen=wanted)) + lines
+            else:
+                lines = tail_lines(earlier[-1], wanted) + lines
+        return lines
+
     def update_log_viewer(self):
+        """Shows the tail of today's log, appending only what was written since the last call."""
         try:
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                lines = f.readlines()[-100:]  # Show last 100 lines
-            content = "".join(lines)
+            path = TEXT_LOG.current_path()
+            size = os.path.getsize(path) if os.path.exists(path) else 0
             self.log_text.config(state=tk.NORMAL)
-            self.log_text.delete("1.0", tk.END)
-            self.log_text.insert(tk.END, content)
+            if path != self.log_view_path or size < self.log_view_offset:
+                # New day's segment (or a replaced file): start again from its tail
+                self.log_text.delete("1.0", tk.END)
+                self.log_text.insert(tk.END, "".join(self.log_viewer_tail(path)))
+            elif size > self.log_view_offset:
+                with open(path, "rb") as f:
+                    f.seek(self.log_view_offset)
+                    self.log_text.insert(tk.END, f.read(size - self.log_view_offset).decode("utf-8", errors="replace"))
+                # The text ends with a newline, so the last "line" is empty
+                line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+                if line_count > LOG_VIEWER_LINES:
+                    self.log_text.delete("1.0", f"{line_count - LOG_VIEWER_LINES + 1}.0")
+            self.log_view_path = path
+            self.log_view_offset = size
+            self.log_text.see(tk.END)
             self.log_text.config(state=tk.DISABLED)
         except Exception as e:
             print("Could not update log viewer:", e)
@@ -228,6 +3247,13 @@ class ServerMonitorApp:
         self.server_list_frame = tk.Frame(self.frame)
         self.server_list_frame.pack()
 
+        self.server_tree = ttk.Treeview(self.server_list_frame, columns=("server",), show="", height=6, selectmode="extended")
+        self.server_tree.column("server", width=260, anchor="w")
+        self.server_tree.pack(side=tk.LEFT)
+        server_scrollbar = tk.Scrollbar(self.server_list_frame, command=self.server_tree.yview)
+        server_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.server_tree.config(yscrollcommand=server_scrollbar.set)
+
         self.render_server_list()
 
         self.add_frame = tk.Frame(self.frame)
@@ -237,6 +3263,7 @@ class ServerMonitorApp:
         self.add_entry = tk.Entry(self.add_frame, textvariable=self.new_server_var)
         self.add_entry.pack(side=tk.LEFT)
         tk.Button(self.add_frame, text="Add", command=self.add_server).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.add_frame, text="Delete Selected", command=self.delete_selected_servers).pack(side=tk.LEFT)
 
         self.button_frame = tk.Frame(self.frame)
         self.button_frame.pack(pady=10)
@@ -244,17 +3271,38 @@ class ServerMonitorApp:
         tk.Button(self.button_frame, text="Apply Changes", command=self.apply_changes).pack(side=tk.LEFT, padx=5)
         tk.Button(self.button_frame, text="Check Now", command=self.check_now).pack(side=tk.LEFT, padx=5)
         tk.Button(self.button_frame, text="Records", command=self.open_log_file).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.button_frame, text="Uptime", command=self.show_uptime_report).pack(side=tk.LEFT, padx=5)
         self.pause_button = tk.Button(self.button_frame, text="Pause Monitor", command=self.toggle_monitoring)
         self.pause_button.pack(side=tk.LEFT, padx=5)
 
         self.results_frame = tk.Frame(self.frame)
         self.results_frame.pack(pady=10)
+
+        self.down_only_var = tk.BooleanVar()
+        tk.Checkbutton(self.results_frame, text="Show down only", variable=self.down_only_var,
+                       command=self.apply_results_filter).pack(anchor="w")
+
+        results_table = tk.Frame(self.results_frame)
+        results_table.pack()
+        self.results_tree = ttk.Treeview(results_table, columns=[c[0] for c in RESULT_COLUMNS], height=8)
+        self.results_tree.heading("#0", text="Server", command=lambda: self.sort_results("#0"))
+        self.results_tree.column("#0", width=200, anchor="w")
+        for column, title, width in RESULT_COLUMNS:
+            self.results_tree.heading(column, text=title, command=lambda c=column: self.sort_results(c))
+            self.results_tree.column(column, width=width, anchor="e" if column != "status" else "w")
+        self.results_tree.tag_configure("online", foreground="green")
+        self.results_tree.tag_configure("offline", foreground="red")
+        self.results_tree.tag_configure("dns", foreground="orange")
+        self.results_tree.pack(side=tk.LEFT)
+        results_scrollbar = tk.Scrollbar(results_table, command=self.results_tree.yview)
+        results_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results_tree.config(yscrollcommand=results_scrollbar.set)
         interval_frame = tk.Frame(self.frame)
         interval_frame.pack(pady=(5, 0))
 
         tk.Label(interval_frame, text="Ping interval (minutes):").pack(side=tk.LEFT)
         self.interval_var = tk.StringVar(value="60")
-        self.interval_var.set(str(self.check_interval // 60))
+        self.interval_var.set(str(self.engine.check_interval // 60))
         interval_dropdown = tk.OptionMenu(interval_frame, self.interval_var, "5", "10", "15", "30", "60", "120", command=self.update_interval)
         interval_dropdown.pack(side=tk.LEFT)
 
@@ -264,7 +3312,7 @@ class ServerMonitorApp:
         tk.Label(email_frame, text="Notification Emails:").pack(side=tk.LEFT)
         self.email_entry = tk.Entry(email_frame, width=35)
         self.email_entry.pack(side=tk.LEFT, padx=5)
-        self.email_entry.insert(0, ", ".join(self.email_list))
+        self.email_entry.insert(0, ", ".join(self.engine.email_list))
         tk.Button(email_frame, text="Save Emails", command=self.save_emails).pack(side=tk.LEFT)
 
         sender_frame = tk.Frame(self.frame)
@@ -273,7 +3321,7 @@ class ServerMonitorApp:
         tk.Label(sender_frame, text="Sender Email:").pack(side=tk.LEFT)
         self.sender_email_entry = tk.Entry(sender_frame, width=25)
         self.sender_email_entry.pack(side=tk.LEFT, padx=5)
-        self.sender_email_entry.insert(0, self.sender_email)
+        self.sender_email_entry.insert(0, self.engine.sender_email)
 
         tk.Label(sender_frame, text="Password:").pack(side=tk.LEFT)
         self.sender_pass_entry = tk.Entry(sender_frame, width=15, show="*")
@@ -303,59 +3351,152 @@ class ServerMonitorApp:
         tk.Button(self.frame, text="Light/Dark Theme", command=self.toggle_theme).pack(pady=(5, 0))
 
     def render_server_list(self):
-        for widget in self.server_list_frame.winfo_children():
-            widget.destroy()
-
+        """Brings the inventory table in line with `buffered_servers`, touching only rows that differ."""
+        shown = set(self.server_tree.get_children(""))
+        wanted = set(self.buffered_servers)
+        for server in shown - wanted:
+            self.server_tree.delete(server)
         for server in self.buffered_servers:
-            row = tk.Frame(self.server_list_frame)
-            row.pack(fill=tk.X, pady=1)
-
-            tk.Label(row, text=server, width=30, anchor="w").pack(side=tk.LEFT)
-            tk.Button(row, text="Delete", command=lambda s=server: self.delete_server(s)).pack(side=tk.RIGHT)
-
-    def render_results(self, results):
-            for widget in self.results_frame.winfo_children():
-                widget.destroy()
-
-            online_count = 0
-            offline_count = 0
-
-            for server, status in results.items():
-                color = "green" if status else "red"
-                text = f"{server} is {'ONLINE ✅' if status else 'OFFLINE ❌'}"
-                label = tk.Label(self.results_frame, text=text, fg=color, font=("Segoe UI", 10, "bold"))
-                label.pack()
+            if server not in shown:
+                self.server_tree.insert("", tk.END, iid=server, values=(server,))
+
+    def render_results(self, results, trace=NULL_TRACE):
+        """Updates the rows of the servers in `results`; other rows are left alone.
+
+        The table keeps one Treeview row per server, so a cycle costs one
+        widget update per probed server and Tk only draws the visible rows.
+        The active column sort is re-applied only when a new, re-shown or
+        changed row can move in it.
+        """
+        resort = False
+        for server, probe in results.items():
+            if probe.online:
+                state = "online"
+            elif probe.error == PROBE_ERROR_DNS:
+                state = "dns"
+            else:
+                state = "offline"
+            stats = self.engine.latency_stats.get(server) or LatencyStats(None, None, None, None)
+            values = (
+                status_text(probe.online, probe.error, probe.detail),
+                self.format_number(probe.rtt_ms),
+                self.format_number(stats.p50),
+                self.format_number(stats.p95),
+                self.format_number(stats.p99),
+                self.format_number(stats.loss_pct, 0)
+            )
+            if self.result_rows.get(server) == values:
+                continue
+
+            previous = self.result_state.get(server)
+            if previous:
+                self.status_counts[previous] -= 1
+            self.status_counts[state] = self.status_counts.get(state, 0) + 1
+            self.result_state[server] = state
+
+            if server in self.result_rows:
+                self.results_tree.item(server, values=values, tags=(state,))
+                # Names never change, so only the value columns can reorder
+                resort = resort or (self.result_sort is not None and self.result_sort[0] != "#0")
+            else:
+                self.results_tree.insert("", tk.END, iid=server, text=server, values=values, tags=(state,))
+                resort = True
+            self.result_rows[server] = values
+            if self.place_result_row(server):
+                resort = True
+
+        if resort and self.result_sort:
+            self.sort_results(self.result_sort[0], toggle=False)
+        self.update_dashboard()
+        with trace.span("update_log_viewer"):
+            self.update_log_viewer()
 
-                if status:
-                    online_count += 1
-                else:
-                    offline_count += 1
+    def render_traced_results(self, results):
+        trace = self.engine.tracer.begin("render")
+        with trace.span("render_results"):
+            self.render_results(results, trace)
+        self.engine.tracer.finish(trace)
+
+    def format_number(self, value, digits=1):
+        return "–" if value is None else f"{value:.{digits}f}"
+
+    def update_dashboard(self):
+        summary = f"✅ {self.status_counts.get('online', 0)} Online | ❌ {self.status_counts.get('offline', 0)} Offline"
+        if self.status_counts.get("dns"):
+            summary += f" | ⚠️ {self.status_counts['dns']} DNS Failed"
+        self.dashboard_label.config(text=summary)
+
+    def place_result_row(self, server):
+        """Hides or shows one row according to the "down only" filter.
+
+        Returns True if the row was put back at the end of the table.
+        """
+        hide = self.down_only_var.get() and self.result_state.get(server) == "online"
+        if hide and server not in self.hidden_rows:
+            self.results_tree.detach(server)
+            self.hidden_rows.add(server)
+        elif not hide and server in self.hidden_rows:
+            self.results_tree.move(server, "", tk.END)
+            self.hidden_rows.discard(server)
+            return True
+        return False
 
-            self.dashboard_label.config(text=f"✅ {online_count} Online | ❌ {offline_count} Offline")
-            self.update_log_viewer()
+    def apply_results_filter(self):
+        for server in self.result_rows:
+            self.place_result_row(server)
+        if self.result_sort:
+            self.sort_results(self.result_sort[0], toggle=False)
+
+    def sort_results(self, column, toggle=True):
+        reverse = False
+        if self.result_sort and self.result_sort[0] == column:
+            reverse = not self.result_sort[1] if toggle else self.result_sort[1]
+        self.result_sort = (column, reverse)
+
+        if column == "#0":
+            key = lambda server: server.lower()
+        elif column == "status":
+            key = lambda server: RESULT_STATE_ORDER.get(self.result_state.get(server), 0)
+        else:
+            index = [c[0] for c in RESULT_COLUMNS].index(column)
+
+            def key(server):
+                value = self.result_rows[server][index]
+                return float(value) if value != "–" else float("inf")
+
+        ordered = sorted(self.results_tree.get_children(""), key=key, reverse=reverse)
+        for position, server in enumerate(ordered):
+            self.results_tree.move(server, "", position)
+
+    def prune_results(self):
+        """Drops rows of servers that are no longer monitored."""
+        current = set(self.engine.servers)
+        for server in [s for s in self.result_rows if s not in current]:
+            self.results_tree.delete(server)
+            del self.result_rows[server]
+            self.status_counts[self.result_state.pop(server)] -= 1
+            self.hidden_rows.discard(server)
+        self.update_dashboard()
 
     def save_settings_to_file(self):
-            data = {
-                "email_list": self.email_list,
-                "sender_email": self.sender_email,
-                "interval_minutes": self.check_interval // 60,
-                "startup_enabled": self.startup_var.get(),
-                "start_minimized": self.start_minimized_var.get()
-            }
-            try:
-                with open(SETTINGS_FILE, "w") as f:
-                    json.dump(data, f)
-            except Exception as e:
-                print("Failed to save settings:", e)
+            self.engine.save_settings(
+                startup_enabled=self.startup_var.get(),
+                start_minimized=self.start_minimized_var.get()
+            )
 
     def toggle_startup(self):
+            winshell = optional_import("winshell") if platform.system() == "Windows" else None
+            win32com_client = optional_import("win32com.client") if winshell is not None else None
+            if win32com_client is None:
+                print("Run at system startup is only supported on Windows.")
+                return
             startup_path = winshell.startup()
             exe_path = sys.executable
             shortcut_path = os.path.join(startup_path, "ServerMonitor.lnk")
 
             if self.startup_var.get():
                 try:
-                    shell = Dispatch('WScript.Shell')
+                    shell = win32com_client.Dispatch('WScript.Shell')
                     shortcut = shell.CreateShortCut(shortcut_path)
                     shortcut.Targetpath = exe_path
                     shortcut.WorkingDirectory = os.path.dirname(exe_path)
@@ -373,85 +3514,101 @@ class ServerMonitorApp:
                         print("Failed to remove startup shortcut:", e)
 
     def load_settings_from_file(self):
-            if not os.path.exists(SETTINGS_FILE):
-                return
-            try:
-                with open(SETTINGS_FILE, "r") as f:
-                    data = json.load(f)
-
-                    self.email_list = data.get("email_list", [])
-                    self.sender_email = data.get("sender_email", "")
-                    interval = data.get("interval_minutes", 60)
-                    self.check_interval = interval * 60
-                    self.time_remaining = self.check_interval
-                    self.startup_var.set(data.get("startup_enabled", False))
-                    self.start_minimized_var.set(data.get("start_minimized", False))
-            except Exception as e:
-                print("Failed to load settings:", e)
+            self.startup_var.set(self.engine.settings.get("startup_enabled", False))
+            self.start_minimized_var.set(self.engine.settings.get("start_minimized", False))
 
     def add_server(self):
         new_server = self.new_server_var.get().strip()
         if new_server and new_server not in self.buffered_servers:
             self.buffered_servers.append(new_server)
             self.new_server_var.set("")
-            self.render_server_list()
+            self.server_tree.insert("", tk.END, iid=new_server, values=(new_server,))
 
-    def delete_server(self, server):
-        if server in self.buffered_servers:
-            self.buffered_servers.remove(server)
-            self.render_server_list()
+    def delete_selected_servers(self):
+        selected = set(self.server_tree.selection())
+        if selected:
+            self.buffered_servers = [s for s in self.buffered_servers if s not in selected]
+            self.server_tree.delete(*selected)
 
     def apply_changes(self):
-        original = set(self.servers)
-        updated = set(self.buffered_servers)
-
-        added = updated - original
-        removed = original - updated
-
-        for s in added:
-            log_server_change("add", s, list(updated))
-        for s in removed:
-            log_server_change("remove", s, list(updated))
-
-        self.servers = list(updated)
-        save_servers(self.servers)
-        self.run_ping(self.servers)
+        self.synced_servers = self.buffered_servers.copy()
+        self.engine.apply_servers(self.buffered_servers)
+
+    def reload_server_list(self):
+        """Shows the engine's server list after it changed, e.g. on an inventory file reload.
+
+        Unapplied edits in the inventory table are only replaced if the user agrees.
+        """
+        servers = self.engine.servers.copy()
+        pending = self.buffered_servers != self.synced_servers and self.buffered_servers != servers
+        self.synced_servers = servers
+        if not pending or messagebox.askyesno(
+                "Inventory Changed",
+                "The server list was changed outside this window. Discard your unapplied edits and show it?"):
+            self.buffered_servers = servers.copy()
+            self.render_server_list()
+        self.prune_results()
 
     def check_now(self):
-        self.run_ping(self.servers)
-
-    def run_ping(self, server_list):
-        def ping_and_update():
-            results = {}
-            alerts = []
-            for s in server_list:
-                status = is_online(s)
-                results[s] = status
-
-                # Smart alert logic: only alert if server went from ONLINE to OFFLINE
-                previous = self.last_status.get(s)
-                if previous is True and status is False:
-                    alerts.append(s)
-                self.last_status[s] = status  # update last known status
-
-            log_status_block(results)
-            trim_log()
-            self.render_results(results)
+        self.engine.check_now()
+
+    def show_uptime_report(self):
+        """Opens a window with per-server uptime over a chosen period, exportable as CSV or JSON."""
+        window = tk.Toplevel(self.root)
+        window.title("Uptime Report")
+        periods = {"Last 24 hours": "24h", "Last 7 days": "7d", "Last 30 days": "30d", "Last 90 days": "90d", "Last year": "365d"}
+        period_var = tk.StringVar(value="Last 7 days")
+        rows = []
+
+        columns = [("uptime", "Uptime %", 80), ("checks", "Checks", 70), ("down", "Down", 60),
+                   ("avg_rtt", "Avg RTT", 80), ("sla", f"SLA {self.engine.sla_target}%", 90)]
+        tree = ttk.Treeview(window, columns=[c[0] for c in columns], height=15)
+        tree.heading("#0", text="Server")
+        tree.column("#0", width=200, anchor="w")
+        for column, title, width in columns:
+            tree.heading(column, text=title)
+            tree.column(column, width=width, anchor="e")
+
+        def refresh(*_):
+            rows[:] = self.engine.rollups.report(parse_report_time(periods[period_var.get()]))
+            tree.delete(*tree.get_children(""))
+            for row in rows:
+                met = row.uptime_pct is not None and row.uptime_pct >= self.engine.sla_target
+                tree.insert("", tk.END, text=row.host, values=(
+                    self.format_number(row.uptime_pct, 3), row.checks, row.down,
+                    self.format_number(row.avg_rtt_ms), "✅ Met" if met else "❌ Missed"
+                ))
+
+        def export():
+            path = filedialog.asksaveasfilename(
+                parent=window, defaultextension=".csv",
+                filetypes=[("CSV", "*.csv"), ("JSON", "*.json")], initialfile="uptime_report.csv"
+            )
+            if path:
+                try:
+                    export_report(rows, path, self.engine.sla_target)
+                except OSError as e:
+                    messagebox.showerror("Export Failed", str(e), parent=window)
 
-            if alerts and self.email_list:
-                self.send_email_alert(alerts)
+        controls = tk.Frame(window)
+        controls.pack(pady=5)
+        tk.OptionMenu(controls, period_var, *periods, command=refresh).pack(side=tk.LEFT)
+        tk.Button(controls, text="Export...", command=export).pack(side=tk.LEFT, padx=5)
+        tree.pack(padx=10, pady=(0, 10))
+        refresh()
 
-        threading.Thread(target=ping_and_update).start()
+    def show_status(self, text):
+        self.dashboard_label.config(text=text)
 
     def toggle_monitoring(self):
-        self.monitoring_active = not self.monitoring_active
-        self.pause_button.config(text="Resume Monitor" if not self.monitoring_active else "Pause Monitor")
+        active = self.engine.toggle_monitoring()
+        self.pause_button.config(text="Pause Monitor" if active else "Resume Monitor")
 
     def toggle_theme(self):
         self.theme_mode = "dark" if self.theme_mode == "light" else "light"
         bg = "#222222" if self.theme_mode == "dark" else "#FFFFFF"
         fg = "#FFFFFF" if self.theme_mode == "dark" else "#000000"
-    
+
         widgets = self.root.winfo_children() + self.frame.winfo_children()
         for w in widgets:
             try:
@@ -462,10 +3619,10 @@ class ServerMonitorApp:
         self.frame.configure(bg=bg)
 
     def update_countdown(self):
-        if self.monitoring_active:
-            minutes, seconds = divmod(self.time_remaining, 60)
+        # The engine's scheduling loop keeps time_remaining up to date
+        if self.engine.monitoring_active:
+            minutes, seconds = divmod(self.engine.time_remaining, 60)
             self.countdown_label.config(text=f"Next ping in: {minutes}m {seconds}s")
-            self.time_remaining -= 1
         else:
             self.countdown_label.config(text="Monitoring paused.")
 
@@ -474,10 +3631,10 @@ class ServerMonitorApp:
     def save_emails(self):
         raw = self.email_entry.get().strip()
         if raw:
-            self.email_list = [email.strip() for email in raw.split(",") if "@" in email]
-            messagebox.showinfo("Saved", f"{len(self.email_list)} email(s) saved.")
+            self.engine.email_list = [email.strip() for email in raw.split(",") if "@" in email]
+            messagebox.showinfo("Saved", f"{len(self.engine.email_list)} email(s) saved.")
         else:
-            self.email_list = []
+            self.engine.email_list = []
             messagebox.showinfo("Cleared", "Email list cleared.")
         self.save_settings_to_file()
 
@@ -486,79 +3643,167 @@ class ServerMonitorApp:
         password = self.sender_pass_entry.get().strip()
 
         if email and password:
-            self.sender_email = email
-            self.sender_password = password
+            self.engine.sender_email = email
+            # Kept in memory only; save_settings never writes the password
+            self.engine.sender_password = password
             self.sender_pass_entry.delete(0, tk.END)  # Auto-clear password field
             messagebox.showinfo("Saved", "Sender email and password saved. Password field has been cleared for security.")
             self.save_settings_to_file()
         else:
             messagebox.showerror("Error", "Both sender email and password are required.")
 
-    def send_email_alert(self, failed_servers):
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-
-        sender = self.sender_email
-        password = self.sender_password
-
-        if not sender or not password:
-            print("No sender credentials set. Skipping email.")
-            return
-        subject = "⚠️ Server Offline Alert"
-
-        body = "The following server(s) are OFFLINE:\n\n"
-        for server in failed_servers:
-            body += f"❌ {server}\n"
-
-        msg = MIMEMultipart()
-        msg["From"] = sender
-        msg["To"] = ", ".join(self.email_list)
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-
-        try:
-            with smtplib.SMTP("smtp.office365.com", 587) as server:
-                server.starttls()
-                server.login(sender, password)
-                server.sendmail(sender, self.email_list, msg.as_string())
-                print("Email alert sent.")
-        except Exception as e:
-            print("Failed to send email:", e)
-
     def update_interval(self, selected):
         try:
             minutes = int(selected)
-            self.check_interval = minutes * 60
-            self.time_remaining = self.check_interval
+            self.engine.set_interval(minutes)
             self.countdown_label.config(text=f"Next ping in: {minutes}m 0s")
         except ValueError:
             messagebox.showerror("Invalid Input", "Interval must be a number.")
-        self.save_settings_to_file()
 
     def open_log_file(self):
-        os.startfile(LOG_FILE)
-
-    def start_hourly_loop(self):
-        def loop():
-            while True:
-                if self.monitoring_active:
-                    if self.is_internet_connected():
-                        self.run_ping(self.servers)
-                    else:
-                        log_line("🌐 No internet connection. Ping skipped.")
-                        self.dashboard_label.config(text="🌐 No internet – skipping ping")
-                for _ in range(self.check_interval):
-                    if not self.monitoring_active:
-                        break
-                    time.sleep(1)
-                    self.time_remaining = self.check_interval - (_ + 1)
-
-        t = threading.Thread(target=loop, daemon=True)
-        t.start()
+        path = TEXT_LOG.current_path()
+        if not os.path.exists(path):
+            path = LOG_DIR
+        if hasattr(os, "startfile"):
+            os.startfile(path)
+        else:
+            opener = "open" if platform.system().lower() == "darwin" else "xdg-open"
+            subprocess.Popen([opener, path])
 
 # --- Launch ---
-if __name__ == "__main__":
+def print_summary(results):
+    online = sum(1 for probe in results.values() if probe.online)
+    dns_failed = sum(1 for probe in results.values() if probe.error == PROBE_ERROR_DNS)
+    timestamp = datetime.datetime.now().strftime(DATE_FORMAT)
+    summary = f"🔁 PING CHECK @ {timestamp}: ✅ {online} Online | ❌ {len(results) - online - dns_failed} Offline"
+    if dns_failed:
+        summary += f" | ⚠️ {dns_failed} DNS Failed"
+    print(summary)
+
+def wait_for_interrupt(stop_event):
+    try:
+        while not stop_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+
+def run_aggregator(profile=None):
+    engine = MonitorEngine(on_results=print_summary, on_status=print)
+    if profile:
+        engine.tracer.profile(*profile)
+    bind = engine.settings.get("aggregator_bind", DEFAULT_AGGREGATOR_BIND)
+    token = engine.settings.get("aggregator_token")
+    try:
+        aggregator = Aggregator(engine, engine.settings.get("aggregator_port", DEFAULT_AGGREGATOR_PORT), bind, token)
+    except OSError as e:
+        sys.exit(f"Failed to start the aggregator: {e}")
+    if not token and bind not in ("127.0.0.1", "::1", "localhost"):
+        print(f"Warning: the aggregator listens on {bind} without an aggregator_token; any host can join as an agent")
+    engine.start_services()
+    aggregator.start()
+    print(f"Aggregating {len(engine.servers)} servers on port {aggregator.server.server_address[1]}")
+    wait_for_interrupt(engine.stop_event)
+    aggregator.stop()
+    engine.stop()
+
+def run_agent(address, name=None, profile=None):
+    host, _, port = address.rpartition(":")
+    engine = AgentEngine((host or "127.0.0.1", int(port or DEFAULT_AGGREGATOR_PORT)), name, on_status=print)
+    if profile:
+        engine.tracer.profile(*profile)
+    engine.run_forever()
+
+def run_report(since, until=None, hosts=None, granularity=None, export=None):
+    """Prints or exports uptime per server from the rollups."""
+    settings = {}
+    if os.path.exists(SETTINGS_FILE):
+        with open(SETTINGS_FILE, "r") as f:
+            settings = json.load(f)
+    sla_target = settings.get("sla_target_pct", DEFAULT_SLA_TARGET_PCT)
+    rollups = RollupStore(
+        ROLLUP_FILE,
+        settings.get("rollup_hourly_days", DEFAULT_ROLLUP_HOURLY_DAYS),
+        settings.get("rollup_daily_days", DEFAULT_ROLLUP_DAILY_DAYS)
+    )
+    try:
+        rollups.backfill(HistoryStore())
+        rows = rollups.report(parse_report_time(since), parse_report_time(until) if until else None, hosts, granularity)
+    finally:
+        rollups.close()
+    if export:
+        export_report(rows, export, sla_target)
+        print(f"Report saved to {export}")
+        return
+    for data in report_rows(rows, sla_target):
+        line = f"{data['host']:<25}"
+        if "bucket" in data:
+            line += f" | {data['bucket']}"
+        uptime = "–" if data["uptime_pct"] is None else f"{data['uptime_pct']:.3f}%"
+        rtt = "–" if data["avg_rtt_ms"] is None else f"{data['avg_rtt_ms']:.1f} ms"
+        line += f" | {uptime:>8} | {data['checks']:>6} checks | {data['down']:>5} down | avg {rtt}"
+        line += " | ✅ SLA met" if data["sla_met"] else f" | ❌ SLA {sla_target}% missed"
+        print(line)
+
+def run_headless(once=False, profile=None):
+    engine = MonitorEngine(on_results=print_summary, on_status=print)
+    if profile:
+        engine.tracer.profile(*profile)
+    if once:
+        engine.run_cycle(engine.servers)
+        # No background maintainer in a one-shot run, so apply retention here like every cycle used to
+        engine.log_maintainer.run()
+        engine.alerts.flush()
+        engine.stop()
+    else:
+        engine.run_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server Availability Monitor")
+    parser.add_argument("--headless", action="store_true", help="run the checker without the GUI")
+    parser.add_argument("--once", action="store_true", help="with --headless, run a single check cycle and exit")
+    parser.add_argument("--render-log", action="store_true", help="print the check history as the human-readable log and exit")
+    parser.add_argument("--aggregator", action="store_true", help="run headless as an aggregator that agents report to")
+    parser.add_argument("--agent", metavar="HOST:PORT", help="run headless as an agent checking its share of the servers for this aggregator")
+    parser.add_argument("--agent-name", help="name the agent registers under (default: hostname-pid)")
+    parser.add_argument("--report", metavar="SINCE", help="print uptime per server since SINCE (e.g. 7d, 24h, 2026-10-01) and exit")
+    parser.add_argument("--until", metavar="UNTIL", help="with --report, end of the period (default: now)")
+    parser.add_argument("--host", action="append", help="with --report, only this server (repeatable)")
+    parser.add_argument("--by", choices=("hour", "day"), help="with --report, one row per server and hour or day")
+    parser.add_argument("--export", metavar="FILE", help="with --report, save as CSV or JSON (by extension) instead of printing")
+    parser.add_argument("--profile-cycles", type=int, default=0, metavar="N", help="profile the next N check cycles into traces/")
+    parser.add_argument("--profile-format", choices=("cprofile", "chrome"), default="cprofile", help="cProfile stats or Chrome trace JSON")
+    args = parser.parse_args(argv)
+    profile = (args.profile_cycles, args.profile_format) if args.profile_cycles > 0 else None
+
+    os.chdir(script_dir)
+    if args.render_log:
+        for record in HistoryStore().read():
+            for line in render_history_record(record):
+                print(line)
+        return
+    if args.report:
+        try:
+            run_report(args.report, args.until, args.host, args.by, args.export)
+        except ValueError as e:
+            sys.exit(str(e))
+        return
+    if args.aggregator:
+        run_aggregator(profile)
+        return
+    if args.agent:
+        run_agent(args.agent, args.agent_name, profile)
+        return
+    if args.headless:
+        run_headless(once=args.once, profile=profile)
+        return
+
+    if tk is None:
+        sys.exit("tkinter is not available. Run with --headless instead.")
     root = tk.Tk()
     app = ServerMonitorApp(root)
+    if profile:
+        app.engine.tracer.profile(*profile)
     root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import json
+import unittest
+
+import server_checker
+from server_checker import ProbeResult
+
+
+def round_trip(samples):
+    wire = json.loads(json.dumps(server_checker.encode_samples(samples)))
+    return server_checker.decode_samples(wire)
+
+
+class SampleEncodingTest(unittest.TestCase):
+    def test_down_host_round_trips(self):
+        samples = {"host": [ProbeResult(False, None)]}
+        self.assertEqual(server_checker.encode_samples(samples), {"host": [[0, None]]})
+        self.assertEqual(round_trip(samples), samples)
+
+    def test_optional_fields_round_trip(self):
+        samples = {"host": [ProbeResult(True, 12.5), ProbeResult(False, None, server_checker.PROBE_ERROR_HTTP, "503")]}
+        self.assertEqual(round_trip(samples), samples)
+
+    def test_short_down_sample_from_earlier_agents_decodes(self):
+        self.assertEqual(server_checker.decode_samples({"host": [[0]]}), {"host": [ProbeResult(False, None)]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+import server_checker
+
+
+def events(samples, host="host"):
+    tracker = server_checker.HostTracker()
+    return [e for e in (tracker.record(host, bool(s)) for s in samples) if e]
+
+
+class HostTrackerTest(unittest.TestCase):
+    def test_outage_right_after_startup_alerts_down_and_up(self):
+        self.assertEqual(events([1, 0, 0, 0, 1]), ["down", "up"])
+        self.assertEqual(events([1, 1, 0, 0, 0, 1]), ["down", "up"])
+
+    def test_alternating_host_is_reported_flapping_once(self):
+        self.assertEqual(events([i % 2 == 0 for i in range(40)]), ["flapping"])
+
+    def test_separate_outages_alert_each_time(self):
+        samples = [1] * 3 + [0] * 6 + [1] * 10 + [0] * 4 + [1] * 5
+        self.assertEqual(events(samples), ["down", "up", "down", "up"])
+
+
+if __name__ == "__main__":
+    unittest.main()